@@ -1,90 +1,254 @@
 # load pandas to deal with the data
 import pandas as pd
 import numpy as np
+import os
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from data_loader import ColumnarWriter, columnar_path, pq, STUDY_AREA
+from geo_partitions import PartitionedWriter, GEOHASH_PRECISION
 
-# Charger les données
-print("Chargement des données...")
-data = pd.read_csv("flickr_data2.csv")
-print("Données chargées.")
-print(f"Dimensions initiales : {data.shape}")
-
-data["Unnamed: 16"].count()
-data["Unnamed: 17"].count()
-data["Unnamed: 18"].count()
-data[' long'].count()
-# Seulement 144 lignes sur 420000 ont des valeurs dans ces colonnes - on peut les supprimer, mais on va déja
-# essayer de comprendre pourquoi elles sont là : caractère spéciaux comme ; dans le titre qui sont interprétés
-# comme des séparateurs de colonnes. On va supprimer ces lignes car elles sont peu nombreuses
-
-print(f"Avant suppression des lignes : {data.shape}")
-
-# Supprimer les lignes ayant des valeurs dans les colonnes "Unnamed: 16", "Unnamed: 17", et "Unnamed: 18"
-data = data[data[["Unnamed: 16", "Unnamed: 17", "Unnamed: 18"]].isna().all(axis=1)]
-
-print(f"Après suppression des lignes : {data.shape}")
-
-# Supprimer les colonnes "Unnamed: 16", "Unnamed: 17", et "Unnamed: 18" pour l'intégralité des lignes
-data = data.drop(columns=["Unnamed: 16", "Unnamed: 17", "Unnamed: 18"])
-
-
-# 2. Supprimer les doublons
-data = data.drop_duplicates(keep='first')
-print(f"Après suppression des doublons : {data.shape}")
-
-# Supprimer les espaces au début et à la fin des noms de colonnes
-data.columns = data.columns.str.strip()
-
-#Supprimer les colonnes inutiles pour le projet
-data = data.drop(columns=["date_upload_minute", "date_upload_hour", "date_upload_day", "date_upload_month","date_upload_year"])
-
-
-# Filtrer les lignes avec des valeurs incorrectes
-data = data[(data['date_taken_year'] > 2010) &  (data['date_taken_year'] <= 2024) &
-            (data['date_taken_month'] > 0) & (data['date_taken_month'] <= 12) & 
-            (data['date_taken_day'] > 0) & (data['date_taken_day'] <= 31) & 
-            (data['date_taken_hour'] >= 0) & (data['date_taken_hour'] < 24) & 
-            (data['date_taken_minute'] >= 0) & (data['date_taken_minute'] < 60)]
-
-# Concaténer les colonnes en une seule colonne de type datetime
-try:
-    # Supprimer les parties non converties comme ".0"
-    data['date_taken_year'] = data['date_taken_year'].astype(str).str.replace('.0', '', regex=False)
-    data['date_taken_month'] = data['date_taken_month'].astype(str).str.replace('.0', '', regex=False)
-    data['date_taken_day'] = data['date_taken_day'].astype(str).str.replace('.0', '', regex=False)
-    data['date_taken_hour'] = data['date_taken_hour'].astype(str).str.replace('.0', '', regex=False)
-    data['date_taken_minute'] = data['date_taken_minute'].astype(str).str.replace('.0', '', regex=False)
-
-    data['date_taken'] = pd.to_datetime(data['date_taken_year'] + '-' +
-                                        data['date_taken_month'] + '-' +
-                                        data['date_taken_day'] + ' ' +
-                                        data['date_taken_hour'] + ':' +
-                                        data['date_taken_minute'],
-                                        format='%Y-%m-%d %H:%M')
-    print("Colonne 'date_taken' créée avec succès.")
-except KeyError as e:
-    print(f"Erreur : La colonne {e} n'existe pas dans le DataFrame.")
-except ValueError as e:
-    print(f"Erreur de conversion de date : {e}")
-
-#Supprimer les colonnes inutiles pour le projet
-data = data.drop(columns=["date_taken_minute", "date_taken_hour", "date_taken_day", "date_taken_month","date_taken_year"])
-
-#Supprimer les lignes qui n'ont ni tags, ni titre
-data = data.dropna(subset=['tags', 'title'], how='all')
-
-# Définir les limites du rectangle
-lat_min = 45.73  # Exemple : latitude minimale
-lat_max = 45.80  # Exemple : latitude maximale
-lon_min = 4.79   # Exemple : longitude minimale
-lon_max = 4.90   # Exemple : longitude maximale
-
-# Filtrer les lignes pour ne garder que celles à l'intérieur du rectangle
-data = data[(data['lat'] >= lat_min) & (data['lat'] <= lat_max) &
-            (data['long'] >= lon_min) & (data['long'] <= lon_max)]
-
-print(f"Après suppression des lignes hors du rectangle : {data.shape}")
-
-# 6. Sauvegarder les données nettoyées
-print("\nSauvegarde des données nettoyées...")
-data.to_csv("flickr_data_cleaned.csv", index=False)
-print("Données sauvegardées dans 'flickr_data_cleaned.csv'")
\ No newline at end of file
+# Fichiers d'entrée / sortie
+RAW_FILE = "flickr_data2.csv"
+CLEANED_FILE = "flickr_data_cleaned.csv"
+
+# Nombre de lignes lues à la fois : c'est lui (et pas la taille du fichier) qui fixe la mémoire utilisée
+CHUNK_SIZE = 200000
+
+# Seulement 144 lignes sur 420000 ont des valeurs dans ces colonnes : caractère spéciaux comme ; dans le titre
+# qui sont interprétés comme des séparateurs de colonnes. On supprime ces lignes car elles sont peu nombreuses
+MALFORMED_COLUMNS = ["Unnamed: 16", "Unnamed: 17", "Unnamed: 18"]
+
+# Colonnes inutiles pour le projet
+UPLOAD_COLUMNS = ["date_upload_minute", "date_upload_hour", "date_upload_day", "date_upload_month", "date_upload_year"]
+DATE_TAKEN_COLUMNS = ["date_taken_minute", "date_taken_hour", "date_taken_day", "date_taken_month", "date_taken_year"]
+
+# Colonnes converties en nombres : un type fixe garantit que deux lignes identiques ont la même
+# empreinte quel que soit le morceau dans lequel elles ont été lues
+NUMERIC_COLUMNS = ['lat', 'long'] + DATE_TAKEN_COLUMNS + UPLOAD_COLUMNS
+TEXT_COLUMNS = ['user', 'tags', 'title']
+
+# Définir les limites du rectangle (zone d'étude partagée avec la carte)
+(lat_min, lon_min), (lat_max, lon_max) = STUDY_AREA
+
+
+def read_raw_chunks(path, chunksize=CHUNK_SIZE):
+    """Lit le fichier brut morceau par morceau, avec des types identiques pour tous les morceaux"""
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {col: 'str' for col in header if col.strip() in TEXT_COLUMNS}
+    return pd.read_csv(path, chunksize=chunksize, dtype=dtypes)
+
+
+def clean_chunk(chunk):
+    """Nettoie un morceau du fichier brut.
+
+    Renvoie les lignes conservées et, pour chacune, l'empreinte de la ligne brute complète
+    (utilisée pour supprimer les doublons entre morceaux).
+    """
+    # Supprimer les lignes ayant des valeurs dans les colonnes "Unnamed: 16", "Unnamed: 17", et "Unnamed: 18"
+    malformed = [col for col in MALFORMED_COLUMNS if col in chunk.columns]
+    chunk = chunk[chunk[malformed].isna().all(axis=1)]
+    chunk = chunk.drop(columns=malformed)
+
+    # Supprimer les espaces au début et à la fin des noms de colonnes
+    chunk.columns = chunk.columns.str.strip()
+
+    for col in NUMERIC_COLUMNS:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    # Une ligne sans identifiant numérique ne peut pas être reliée à Flickr : elle est supprimée
+    # (le script d'origine gardait ces lignes, avec un id texte ou vide)
+    chunk['id'] = pd.to_numeric(chunk['id'], errors='coerce')
+    chunk = chunk.dropna(subset=['id']).astype({'id': 'int64'})
+
+    # Empreinte de la ligne avant tout filtrage : deux lignes en double ont la même empreinte
+    hashes = pd.util.hash_pandas_object(chunk, index=False)
+
+    #Supprimer les colonnes inutiles pour le projet
+    chunk = chunk.drop(columns=UPLOAD_COLUMNS)
+
+    # Filtrer les lignes avec des valeurs incorrectes
+    chunk = chunk[(chunk['date_taken_year'] > 2010) & (chunk['date_taken_year'] <= 2024) &
+                  (chunk['date_taken_month'] > 0) & (chunk['date_taken_month'] <= 12) &
+                  (chunk['date_taken_day'] > 0) & (chunk['date_taken_day'] <= 31) &
+                  (chunk['date_taken_hour'] >= 0) & (chunk['date_taken_hour'] < 24) &
+                  (chunk['date_taken_minute'] >= 0) & (chunk['date_taken_minute'] < 60)]
+
+    # Assembler les colonnes en une seule colonne de type datetime
+    # Les dates impossibles (ex : 31 février) deviennent NaT et sont supprimées
+    parts = chunk[DATE_TAKEN_COLUMNS].rename(columns=lambda col: col.replace('date_taken_', ''))
+    chunk = chunk.assign(date_taken=pd.to_datetime(parts, errors='coerce'))
+    chunk = chunk.dropna(subset=['date_taken'])
+
+    #Supprimer les colonnes inutiles pour le projet
+    chunk = chunk.drop(columns=DATE_TAKEN_COLUMNS)
+
+    #Supprimer les lignes qui n'ont ni tags, ni titre
+    chunk = chunk.dropna(subset=['tags', 'title'], how='all')
+
+    # Les photos sans coordonnées ne peuvent être placées ni dans la zone ni dans une partition
+    chunk = chunk.dropna(subset=['lat', 'long'])
+
+    return chunk, hashes.loc[chunk.index].to_numpy()
+
+
+def in_study_area(chunk):
+    """Masque des lignes à l'intérieur du rectangle de la zone d'étude"""
+    return ((chunk['lat'] >= lat_min) & (chunk['lat'] <= lat_max) &
+            (chunk['long'] >= lon_min) & (chunk['long'] <= lon_max))
+
+
+class SeenHashes:
+    """Empreintes des lignes déjà écrites (8 octets par ligne conservée).
+
+    Les empreintes sont rangées en tableaux triés de tailles décroissantes : chaque morceau
+    ajoute un tableau, fusionné avec le précédent tant que celui-ci n'est pas au moins deux fois
+    plus grand. Il y a donc O(log n) tableaux et chaque empreinte n'est recopiée que O(log n)
+    fois, au lieu de recopier toutes les empreintes à chaque morceau.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, hashes):
+        """Masque des empreintes déjà ajoutées"""
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            found |= run[pos] == hashes
+        return found
+
+    def add(self, hashes):
+        """Ajoute des empreintes absentes et distinctes"""
+        if not len(hashes):
+            return
+        run = np.sort(hashes)
+        while self.runs and len(self.runs[-1]) <= 2 * len(run):
+            # Deux suites triées : le tri stable (timsort) les fusionne en temps linéaire
+            run = np.concatenate([self.runs.pop(), run])
+            run.sort(kind='stable')
+        self.runs.append(run)
+
+
+def drop_seen_duplicates(chunk, hashes, seen):
+    """Supprime les lignes déjà rencontrées (dans ce morceau ou dans un précédent).
+
+    `seen` (SeenHashes) reçoit les empreintes des lignes conservées. Renvoie le morceau dédoublonné.
+    """
+    # Doublons à l'intérieur du morceau (on garde la première occurrence)
+    first = ~pd.Series(hashes).duplicated(keep='first').to_numpy()
+
+    # Doublons avec les morceaux précédents
+    keep = first & ~seen.contains(hashes)
+    seen.add(hashes[keep])
+    return chunk[keep]
+
+
+def iter_cleaned_chunks(path, chunksize=CHUNK_SIZE, n_workers=1):
+    """Produit les morceaux nettoyés dans l'ordre du fichier.
+
+    Avec n_workers > 1 les morceaux sont nettoyés en parallèle, mais jamais plus de
+    2 * n_workers morceaux ne sont en mémoire en même temps.
+    """
+    reader = read_raw_chunks(path, chunksize)
+    if n_workers <= 1:
+        for chunk in reader:
+            yield len(chunk), clean_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        pending = deque()
+        for chunk in reader:
+            pending.append((len(chunk), executor.submit(clean_chunk, chunk)))
+            if len(pending) >= 2 * n_workers:
+                n_rows, future = pending.popleft()
+                yield n_rows, future.result()
+        while pending:
+            n_rows, future = pending.popleft()
+            yield n_rows, future.result()
+
+
+def clean_file(input_path=RAW_FILE, output_path=CLEANED_FILE, chunksize=CHUNK_SIZE, n_workers=1,
+               write_columnar=True, partitioned_dir=None, precision=GEOHASH_PRECISION, by_year=True):
+    """Nettoie le fichier brut en flux et écrit les lignes nettoyées au fur et à mesure.
+
+    Le CSV ne garde que la zone d'étude. Si pyarrow est disponible, une copie typée au format
+    Parquet est écrite à côté du CSV et, si partitioned_dir est donné, toutes les lignes
+    nettoyées (toutes zones) y sont écrites, partitionnées par préfixe de geohash et par année.
+    """
+    print("Nettoyage des données par morceaux...")
+    columnar = ColumnarWriter(columnar_path(output_path)) if write_columnar and pq is not None else None
+    partitioned = None
+    if partitioned_dir is not None:
+        partitioned = PartitionedWriter(partitioned_dir, precision, by_year)
+    seen = SeenHashes()
+    total_read = 0
+    total_written = 0
+
+    # Écrire dans un fichier temporaire pour ne jamais laisser un fichier nettoyé incomplet
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as output:
+            for n_rows, (chunk, hashes) in iter_cleaned_chunks(input_path, chunksize, n_workers):
+                if partitioned is None:
+                    # Sans sortie partitionnée, seules les empreintes de la zone sont gardées
+                    in_area = in_study_area(chunk).to_numpy()
+                    chunk, hashes = chunk[in_area], hashes[in_area]
+                chunk = drop_seen_duplicates(chunk, hashes, seen)
+                if partitioned is not None:
+                    partitioned.write(chunk)
+                    chunk = chunk[in_study_area(chunk)]
+                chunk.to_csv(output, index=False, header=(total_read == 0))
+                if columnar is not None:
+                    columnar.write(chunk)
+                total_read += n_rows
+                total_written += len(chunk)
+                print(f"{total_read} lignes lues, {total_written} lignes conservées")
+        os.replace(tmp_path, output_path)
+
+        # Fermé après le CSV pour que le fichier Parquet soit considéré à jour
+        if columnar is not None:
+            columnar.close()
+            print(f"Copie typée sauvegardée dans '{columnar.path}'")
+        if partitioned is not None:
+            partitioned.close()
+            print(f"{len(partitioned.partitions)} partitions sauvegardées dans '{partitioned.root}'")
+    except BaseException:
+        # Nettoyage interrompu : ne laisser aucune sortie temporaire (les anciennes sorties restent)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if columnar is not None:
+            columnar.abort()
+        if partitioned is not None:
+            partitioned.abort()
+        raise
+
+    print(f"Après nettoyage : {total_written} lignes sur {total_read}")
+    return total_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nettoyage du fichier Flickr brut")
+    parser.add_argument('--input', default=RAW_FILE)
+    parser.add_argument('--output', default=CLEANED_FILE)
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE,
+                        help="Nombre de lignes lues à la fois")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Nombre de processus pour nettoyer les morceaux en parallèle")
+    parser.add_argument('--no-parquet', action='store_true',
+                        help="Ne pas écrire la copie typée au format Parquet")
+    parser.add_argument('--partitioned', default=None, metavar='DOSSIER',
+                        help="Écrire aussi toutes les lignes nettoyées (toutes zones) dans ce dossier, "
+                             "partitionnées par préfixe de geohash")
+    parser.add_argument('--precision', type=int, default=GEOHASH_PRECISION,
+                        help="Longueur des préfixes de geohash des partitions")
+    parser.add_argument('--no-year', action='store_true',
+                        help="Ne pas partitionner aussi par année")
+    args = parser.parse_args()
+
+    # 6. Sauvegarder les données nettoyées
+    clean_file(args.input, args.output, args.chunksize, args.workers, not args.no_parquet,
+               args.partitioned, args.precision, not args.no_year)
+    print(f"Données sauvegardées dans '{args.output}'")
@@ -0,0 +1,114 @@
+import numpy as np
+from scipy import sparse
+from tokenization import take
+
+NOISE_NAME = "Non clustérisé"
+
+
+def _cluster_indicator(cluster_idx, n_clusters):
+    """Matrice creuse (clusters x lignes) qui vaut 1 quand la ligne appartient au cluster"""
+    n_rows = len(cluster_idx)
+    member = cluster_idx >= 0
+    return sparse.csr_matrix((np.ones(member.sum()), (cluster_idx[member], np.flatnonzero(member))),
+                             shape=(n_clusters, n_rows))
+
+
+def _row_term_matrix(terms, owner, n_rows, n_terms):
+    """Matrice creuse (lignes x termes) du nombre d'occurrences de chaque terme"""
+    return sparse.csr_matrix((np.ones(len(terms)), (owner, terms)), shape=(n_rows, n_terms))
+
+
+def name_clusters(row_tokens, rows, partition, mots_exclus):
+    """Nomme chaque cluster avec ses termes au meilleur score TF-IDF.
+
+    row_tokens : TokenizedDataset du jeu de données
+    rows       : lignes (dans row_tokens) des points clusterisés, dans l'ordre du DataFrame
+    partition  : ClusterPartition des labels de ces points (-1 pour le bruit)
+
+    Tous les clusters sont traités ensemble : une agrégation par label de la matrice
+    lignes x termes donne les comptes de chaque cluster, puis IDF et seuil sont vectorisés.
+    Le nom garde les termes dont le score atteint 70 % du meilleur, au plus 3, dans
+    l'ordre de leur première apparition dans le cluster.
+    """
+    unique_clusters = partition.clusters
+    has_noise = -1 in partition
+    clusters = unique_clusters[1:] if has_noise else unique_clusters
+    n_clusters = len(clusters)
+    n_terms = len(row_tokens.term_vocab)
+    n_rows = len(rows)
+
+    # Numéro 0..n_clusters-1 de chaque point (-1 pour le bruit, premier groupe de la partition)
+    cluster_idx = partition.group - 1 if has_noise else partition.group
+
+    tag_excluded = row_tokens.excluded_tags(mots_exclus)
+    term_excluded = row_tokens.excluded_terms(mots_exclus)
+    term_scorable = (row_tokens.term_length > 2) & ~term_excluded
+
+    # Tags entiers non exclus de chaque point
+    tag_ids, tag_owner = take(row_tokens.tag_indptr, row_tokens.tag_ids, rows)
+    kept = ~tag_excluded[tag_ids]
+    tag_ids, tag_owner = tag_ids[kept], tag_owner[kept]
+
+    # Étape 1: fréquence des documents (nombre de clusters où chaque terme apparaît)
+    doc_terms = row_tokens.tag_doc_term[tag_ids]
+    has_doc = doc_terms >= 0
+    title_terms, title_owner = take(row_tokens.title_indptr, row_tokens.title_terms, rows)
+    kept = ~(term_excluded[title_terms] | row_tokens.term_has_digit[title_terms])
+    doc_matrix = _row_term_matrix(np.concatenate([doc_terms[has_doc], title_terms[kept]]),
+                                  np.concatenate([tag_owner[has_doc], title_owner[kept]]),
+                                  n_rows, n_terms)
+    indicator = _cluster_indicator(cluster_idx, n_clusters)
+    doc_freq = np.asarray(((indicator @ doc_matrix) > 0).sum(axis=0)).ravel()
+
+    # Étape 2: comptes (cluster, terme) des sous-tags, avec la première apparition de chaque couple
+    terms, term_owner = take(row_tokens.tag_terms_indptr, row_tokens.tag_terms, tag_ids)
+    term_cluster = cluster_idx[tag_owner[term_owner]]
+    in_cluster = term_cluster >= 0
+    keys = term_cluster[in_cluster] * n_terms + terms[in_cluster]
+    keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    key_cluster = keys // n_terms
+    key_term = keys % n_terms
+    total_terms = np.bincount(key_cluster, weights=counts, minlength=n_clusters)
+
+    # TF normalisé et IDF ajusté, pour les seuls termes pouvant nommer un cluster
+    scorable = term_scorable[key_term]
+    key_cluster, key_term, first, counts = key_cluster[scorable], key_term[scorable], first[scorable], counts[scorable]
+    tf = counts / total_terms[key_cluster]
+    idf = np.log(n_clusters / (doc_freq[key_term] + 1e-6))
+    scores = tf * idf
+
+    # Sélection adaptative : termes à au moins 70 % du meilleur score du cluster
+    best = np.full(n_clusters, -np.inf)
+    np.maximum.at(best, key_cluster, scores)
+    selected = scores >= 0.7 * best[key_cluster]
+
+    # Récupérer au moins 1 terme (le premier au meilleur score) si aucun n'atteint le seuil
+    has_scores = np.bincount(key_cluster, minlength=n_clusters) > 0
+    has_selected = np.bincount(key_cluster[selected], minlength=n_clusters) > 0
+    fallback = (scores == best[key_cluster]) & ~has_selected[key_cluster]
+    selected |= fallback
+
+    # Ordre de première apparition dans le cluster, au plus 3 termes (1 pour le repli)
+    sel = np.flatnonzero(selected)
+    sel = sel[np.lexsort((first[sel], key_cluster[sel]))]
+    sel_cluster = key_cluster[sel]
+    group_start = np.searchsorted(sel_cluster, sel_cluster, side='left')
+    rank = np.arange(len(sel)) - group_start
+    limit = np.where(fallback[sel], 1, 3)
+    sel = sel[rank < limit]
+
+    names = [[] for _ in range(n_clusters)]
+    for c, t in zip(key_cluster[sel], key_term[sel]):
+        names[c].append(row_tokens.term_vocab[t].capitalize())
+
+    cluster_tags = {}
+    for cluster_id in unique_clusters:
+        if cluster_id == -1:
+            cluster_tags[cluster_id] = NOISE_NAME
+            continue
+        c = partition.index(cluster_id) - has_noise
+        if has_scores[c]:
+            cluster_tags[cluster_id] = ', '.join(names[c])
+        else:
+            cluster_tags[cluster_id] = f"Cluster {cluster_id}"
+    return cluster_tags
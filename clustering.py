@@ -0,0 +1,541 @@
+import os
+import hashlib
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+EARTH_RADIUS = 6371008.8  # Rayon moyen de la Terre en mètres
+METRES_PER_DEGREE = EARTH_RADIUS * np.pi / 180  # ~111 km par degré de latitude
+MAX_CACHED_INDEXES = 2
+# Centroïdes K-means sauvegardés, pour repartir de la dernière solution
+CENTROIDS_FILE = 'kmeans_centroids.npz'
+# Initialisations k-means++ essayées sur le premier lot (sans centroïdes sauvegardés)
+KMEANS_N_INIT = 3
+
+
+def project_to_metres(coords, origin=None):
+    """Projette des coordonnées (lat, long) en degrés sur un plan local en mètres.
+
+    Projection équirectangulaire centrée sur origin (par défaut le centre des points) :
+    à l'échelle d'une ville l'erreur est négligeable et une distance euclidienne
+    correspond à une distance au sol, quelle que soit la direction.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if origin is None:
+        origin = coords.mean(axis=0)
+    lat0, lon0 = origin
+    x = (coords[:, 1] - lon0) * METRES_PER_DEGREE * np.cos(np.radians(lat0))
+    y = (coords[:, 0] - lat0) * METRES_PER_DEGREE
+    return np.column_stack([x, y])
+
+
+def metres_to_degrees(points, origin):
+    """Inverse de project_to_metres : points (x, y) en mètres vers (lat, long) en degrés"""
+    points = np.asarray(points, dtype=np.float64)
+    lat0, lon0 = origin
+    lat = lat0 + points[:, 1] / METRES_PER_DEGREE
+    lon = lon0 + points[:, 0] / (METRES_PER_DEGREE * np.cos(np.radians(lat0)))
+    return np.column_stack([lat, lon])
+
+
+def degrees_to_metres(eps_degrees):
+    """Distance nord-sud en mètres correspondant à un écart en degrés (0.0003° -> ~33 m)"""
+    return eps_degrees * METRES_PER_DEGREE
+
+
+def _fingerprint(X):
+    """Empreinte d'un tableau de coordonnées, pour savoir si l'index spatial est réutilisable"""
+    X = np.ascontiguousarray(X)
+    return X.shape, hash(X.tobytes())
+
+
+def threshold_graph(graph, radius):
+    """Garde les arêtes d'un graphe de distances CSR dont la distance est au plus radius.
+
+    Les distances nulles (le point lui-même, les doublons) sont conservées.
+    """
+    keep = graph.data <= radius
+    kept_before = np.concatenate([[0], np.cumsum(keep)])
+    indptr = kept_before[graph.indptr]
+    return sparse.csr_matrix((graph.data[keep], graph.indices[keep], indptr), shape=graph.shape)
+
+
+def dbscan_from_graph(graph, min_samples):
+    """Étape de DBSCAN qui suit la recherche des voisins, à partir du graphe de voisinage.
+
+    - cœurs : points ayant au moins min_samples voisins (eux-mêmes compris) ;
+    - clusters : composantes connexes du graphe restreint aux cœurs, numérotées dans
+      l'ordre de leur premier point ;
+    - bordure : un point non cœur voisin d'un cœur prend le plus petit numéro de cluster
+      parmi ses cœurs voisins, comme le parcours de sklearn.
+    Les labels sont donc identiques à sklearn.cluster.DBSCAN sur le même voisinage.
+    """
+    n = graph.shape[0]
+    core = np.diff(graph.indptr) >= min_samples
+    rows = np.repeat(np.arange(n), np.diff(graph.indptr))
+    cols = graph.indices
+
+    labels = np.full(n, -1, dtype=np.int64)
+    core_idx = np.flatnonzero(core)
+    if len(core_idx) == 0:
+        return labels
+
+    # Composantes connexes du graphe restreint aux arêtes entre cœurs (les lignes CSR restent triées)
+    core_edges = core[rows] & core[cols]
+    indptr = np.concatenate([[0], np.cumsum(core_edges)])[graph.indptr]
+    core_graph = sparse.csr_matrix((np.ones(core_edges.sum()), cols[core_edges], indptr), shape=graph.shape)
+    _, component = connected_components(core_graph, directed=False)
+    component = component[core_idx]
+
+    # Renuméroter dans l'ordre du premier cœur de chaque composante
+    found, first = np.unique(component, return_index=True)
+    renumber = np.empty(found.max() + 1, dtype=np.int64)
+    renumber[component[np.sort(first)]] = np.arange(len(found))
+    labels[core_idx] = renumber[component]
+
+    # Points de bordure : plus petit label parmi les cœurs voisins (arêtes triées par ligne)
+    border_edges = np.flatnonzero(~core[rows] & core[cols])
+    if len(border_edges):
+        border_rows = rows[border_edges]
+        starts = np.flatnonzero(np.concatenate([[True], border_rows[1:] != border_rows[:-1]]))
+        labels[border_rows[starts]] = np.minimum.reduceat(labels[cols[border_edges]], starts)
+    return labels
+
+
+class SpatialNeighbors:
+    """Index spatial construit une seule fois pour un ensemble de coordonnées.
+
+    metric :
+      - 'plane'     : projection locale en mètres + KD-tree (par défaut)
+      - 'haversine' : distance sur la sphère, BallTree sur les coordonnées en radians
+      - 'degrees'   : distance euclidienne sur les degrés bruts (ancien comportement)
+    Les rayons sont en mètres, sauf pour 'degrees' où ils sont en degrés.
+    """
+
+    def __init__(self, X, metric='plane', n_jobs=-1):
+        self.metric = metric
+        self.fingerprint = _fingerprint(X)
+        if metric == 'plane':
+            self.points = project_to_metres(X)
+            self.nn = NearestNeighbors(algorithm='kd_tree', n_jobs=n_jobs)
+        elif metric == 'haversine':
+            self.points = np.radians(np.asarray(X, dtype=np.float64))
+            self.nn = NearestNeighbors(algorithm='ball_tree', metric='haversine', n_jobs=n_jobs)
+        elif metric == 'degrees':
+            self.points = np.asarray(X, dtype=np.float64)
+            self.nn = NearestNeighbors(algorithm='kd_tree', n_jobs=n_jobs)
+        else:
+            raise ValueError(f"Métrique inconnue : {metric}")
+        self.nn.fit(self.points)
+        # Graphe des voisins mis en cache et rayon auquel il a été calculé
+        self.graph = None
+        self.graph_radius = 0
+
+    def matches(self, X):
+        return _fingerprint(X) == self.fingerprint
+
+    def index_radius(self, radius):
+        """Convertit un rayon (en mètres, ou en degrés pour 'degrees') dans l'unité de l'index"""
+        if self.metric == 'haversine':
+            return radius / EARTH_RADIUS
+        return radius
+
+    def radius_graph(self, radius, max_radius=None):
+        """Graphe creux des voisins à moins de radius, avec les distances.
+
+        Le graphe est calculé une seule fois (sur tous les cœurs) au plus grand rayon
+        demandé, max_radius si précisé ; un rayon plus petit s'obtient en filtrant les
+        distances, sans nouvelle recherche de voisins.
+        """
+        if self.graph is None or self.graph_radius < radius:
+            build_radius = max(radius, max_radius or radius)
+            print(f"Calcul du graphe des voisins à {build_radius} ...")
+            self.graph = self.nn.radius_neighbors_graph(self.points, radius=self.index_radius(build_radius),
+                                                        mode='distance')
+            self.graph_radius = build_radius
+        if radius == self.graph_radius:
+            return self.graph
+        return threshold_graph(self.graph, self.index_radius(radius))
+
+
+class GeoDBSCAN:
+    """DBSCAN pour des coordonnées (lat, long), avec eps exprimé en mètres.
+
+    S'utilise comme sklearn.cluster.DBSCAN (fit_predict sur un tableau [[lat, long], ...]).
+    L'index spatial et le graphe des voisins (calculé en parallèle au rayon max_eps) sont
+    gardés tant que les coordonnées ne changent pas : changer eps (jusqu'à max_eps) ou
+    min_samples ne demande qu'un filtrage du graphe et un calcul de composantes connexes.
+
+    Avec metric='degrees' et eps en degrés, les labels sont identiques à
+    DBSCAN(eps=eps, min_samples=min_samples) sur les degrés bruts.
+    """
+
+    def __init__(self, eps=33.0, min_samples=5, metric='plane', n_jobs=-1, max_eps=None):
+        self.eps = eps
+        self.min_samples = min_samples
+        # Rayon auquel le graphe des voisins est calculé : tout eps plus petit est gratuit
+        self.max_eps = max_eps
+        self.metric = metric
+        self.n_jobs = n_jobs
+        # Derniers index construits (jeu complet et échantillon, par exemple)
+        self.indexes = []
+        self.labels_ = None
+
+    def spatial_index(self, X):
+        """Index spatial des coordonnées X (reconstruit seulement si X change)"""
+        for neighbors in self.indexes:
+            if neighbors.metric == self.metric and neighbors.matches(X):
+                return neighbors
+        neighbors = SpatialNeighbors(X, self.metric, self.n_jobs)
+        self.indexes = [neighbors] + self.indexes[:MAX_CACHED_INDEXES - 1]
+        return neighbors
+
+    def fit(self, X):
+        neighbors = self.spatial_index(X)
+        graph = neighbors.radius_graph(self.eps, self.max_eps)
+        self.labels_ = dbscan_from_graph(graph, self.min_samples)
+        return self
+
+    def fit_predict(self, X):
+        return self.fit(X).labels_
+
+
+# Décalages (en cellules de côté eps/2) dont le centre est à moins de eps : 13 cellules,
+# soit une surface de 3.25 eps² très proche de celle du disque de rayon eps (3.14 eps²)
+GRID_STENCIL = np.array([(di, dj) for di in range(-2, 3) for dj in range(-2, 3) if di * di + dj * dj <= 4])
+
+
+class GridDBSCAN:
+    """DBSCAN approché sur une grille uniforme, en temps et mémoire quasi linéaires.
+
+    Les points sont répartis dans des cellules de côté eps/2 (projection locale en mètres) :
+      1. une cellule est dense si ses 13 cellules voisines (centre à moins de eps)
+         contiennent au moins min_samples points ; tous ses points sont alors des cœurs ;
+      2. les cellules denses voisines sont reliées (composantes connexes, équivalent d'un
+         union-find) et chaque composante forme un cluster ;
+      3. les points des autres cellules rejoignent le cluster de la cellule dense voisine
+         la plus proche, ou restent du bruit (-1).
+
+    Seules les cellules occupées sont manipulées : aucune distance entre points n'est calculée.
+    """
+
+    def __init__(self, eps=33.0, min_samples=5):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.labels_ = None
+
+    def fit(self, X):
+        points = project_to_metres(X)
+        side = self.eps / 2
+        cells = np.floor(points / side).astype(np.int64)
+
+        # Cellules occupées, identifiées par une clé entière triée
+        cells -= cells.min(axis=0) - 2  # marge pour les décalages du voisinage
+        width = cells[:, 1].max() + 3
+        keys = cells[:, 0] * width + cells[:, 1]
+        cell_keys, point_cell, cell_counts = np.unique(keys, return_inverse=True, return_counts=True)
+        n_cells = len(cell_keys)
+
+        # Voisin de chaque cellule pour chaque décalage du voisinage (-1 si inoccupé)
+        neighbours = np.full((n_cells, len(GRID_STENCIL)), -1, dtype=np.int64)
+        for k, (di, dj) in enumerate(GRID_STENCIL):
+            target = cell_keys + di * width + dj
+            pos = np.minimum(np.searchsorted(cell_keys, target), n_cells - 1)
+            found = cell_keys[pos] == target
+            neighbours[found, k] = pos[found]
+
+        # 1. Cellules denses
+        neighbour_counts = np.where(neighbours >= 0, cell_counts[neighbours], 0).sum(axis=1)
+        dense = neighbour_counts >= self.min_samples
+
+        # 2. Relier les cellules denses voisines
+        src, k = np.nonzero(neighbours >= 0)
+        dst = neighbours[src, k]
+        linked = dense[src] & dense[dst]
+        graph = sparse.coo_matrix((np.ones(linked.sum()), (src[linked], dst[linked])), shape=(n_cells, n_cells))
+        _, component = connected_components(graph, directed=False)
+        cell_label = np.where(dense, component, -1)
+
+        # 3. Cellules non denses : cluster de la cellule dense voisine la plus proche
+        distance_order = np.argsort((GRID_STENCIL ** 2).sum(axis=1), kind='stable')
+        for k in distance_order:
+            nb = neighbours[:, k]
+            attach = (cell_label == -1) & ~dense & (nb >= 0)
+            attach[attach] = dense[nb[attach]]
+            cell_label[attach] = component[nb[attach]]
+
+        labels = cell_label[point_cell]
+
+        # Numéroter les clusters dans l'ordre d'apparition des points, comme sklearn
+        clustered = labels >= 0
+        if clustered.any():
+            found, first = np.unique(labels[clustered], return_index=True)
+            renumber = np.empty(found.max() + 1, dtype=np.int64)
+            renumber[found[np.argsort(first)]] = np.arange(len(found))
+            labels[clustered] = renumber[labels[clustered]]
+        self.labels_ = labels
+        return self
+
+    def fit_predict(self, X):
+        return self.fit(X).labels_
+
+    def compare_with_exact(self, X, sample_size=5000, random_state=42):
+        """Compare les labels approchés à ceux de DBSCAN exact sur un échantillon de points.
+
+        Renvoie un dictionnaire : taille de l'échantillon, indice de Rand ajusté (1 = identique)
+        et part des points dont le statut bruit / cluster diffère.
+        """
+        from sklearn.metrics import adjusted_rand_score
+
+        X = np.asarray(X, dtype=np.float64)
+        rng = np.random.default_rng(random_state)
+        if len(X) > sample_size:
+            X = X[np.sort(rng.choice(len(X), sample_size, replace=False))]
+        approx = GridDBSCAN(self.eps, self.min_samples).fit_predict(X)
+        exact = GeoDBSCAN(self.eps, self.min_samples).fit_predict(X)
+        return {
+            'sample_size': len(X),
+            'ari': adjusted_rand_score(exact, approx),
+            'noise_mismatch': float(np.mean((exact == -1) != (approx == -1))),
+        }
+
+
+class HierarchicalDBSCAN:
+    """Clustering hiérarchique par densité (HDBSCAN) sur des coordonnées (lat, long).
+
+    La hiérarchie (arbre de liaison simple sur les distances d'atteignabilité mutuelle,
+    en mètres) est calculée une seule fois par ensemble de coordonnées et gardée en cache :
+      - cut=None : sélection automatique des clusters les plus stables, chaque zone avec
+        sa propre échelle (Vieux-Lyon dense et périphérie clairsemée) ;
+      - cut=d    : coupe à plat de la même hiérarchie à la distance d (en mètres),
+        équivalente à un DBSCAN de eps=d, obtenue sans nouveau calcul.
+
+    Les labels obtenus sur tout le jeu de données sont conservés tels quels par
+    map_visualization.main (pas de nouveau clustering sur l'échantillon).
+    """
+
+    keep_labels_on_sample = True
+
+    def __init__(self, min_cluster_size=15, min_samples=5, cut=None):
+        self.min_cluster_size = min_cluster_size
+        self.min_samples = min_samples
+        self.cut = cut
+        # (clé, modèle) de la hiérarchie en cache : remplacés ensemble, une fois l'ajustement terminé,
+        # pour que le thread de Tk ne voie jamais un modèle en cours d'ajustement
+        self._fitted = None
+        # Clé des dernières données demandées (la hiérarchie en cache peut être celle de données plus anciennes)
+        self.requested_key = None
+        self.labels_ = None
+
+    @property
+    def model(self):
+        fitted = self._fitted
+        return None if fitted is None else fitted[1]
+
+    @property
+    def model_key(self):
+        fitted = self._fitted
+        return None if fitted is None else fitted[0]
+
+    def hierarchy(self, X):
+        """Modèle HDBSCAN ajusté sur X (recalculé seulement si X ou les paramètres changent)"""
+        from sklearn.cluster import HDBSCAN
+
+        key = (_fingerprint(X), self.min_samples, self.min_cluster_size)
+        self.requested_key = key
+        fitted = self._fitted
+        if fitted is None or fitted[0] != key:
+            print("Calcul de la hiérarchie HDBSCAN...")
+            model = HDBSCAN(min_cluster_size=self.min_cluster_size, min_samples=self.min_samples,
+                            algorithm='kd_tree', n_jobs=-1, copy=False)
+            model.fit(project_to_metres(X))
+            fitted = (key, model)
+            self._fitted = fitted
+        return fitted[1]
+
+    def current_model(self, min_samples=None, min_cluster_size=None):
+        """Hiérarchie en cache si elle est celle des dernières données demandées (et, s'ils sont
+        donnés, de ces paramètres), sinon None"""
+        fitted = self._fitted
+        if fitted is None or fitted[0] != self.requested_key:
+            return None
+        key, model = fitted
+        if min_samples is not None and key[1] != min_samples:
+            return None
+        if min_cluster_size is not None and key[2] != min_cluster_size:
+            return None
+        return model
+
+    def has_hierarchy(self, min_samples=None, min_cluster_size=None):
+        return self.current_model(min_samples, min_cluster_size) is not None
+
+    def labels_at(self, cut=None, model=None):
+        """Labels à plat de la hiérarchie en cache, pour une coupe donnée (None = automatique)"""
+        model = self.model if model is None else model
+        if cut is None:
+            return model.labels_
+        return model.dbscan_clustering(cut_distance=cut, min_cluster_size=self.min_cluster_size)
+
+    def fit(self, X):
+        self.labels_ = self.labels_at(self.cut, self.hierarchy(X))
+        return self
+
+    def fit_predict(self, X):
+        return self.fit(X).labels_
+
+
+class StreamingKMeans:
+    """K-means par mini-lots pour des coordonnées (lat, long), distances en mètres.
+
+    Les centroïdes sont mis à jour lot par lot (partial_fit de MiniBatchKMeans) : la mémoire
+    ne dépend que de la taille des lots, et quelques passes suffisent à approcher l'inertie
+    d'un K-means complet. Les labels de tous les points sont ensuite obtenus en une passe
+    d'affectation vectorisée au centroïde le plus proche.
+
+    Les centroïdes (en degrés) sont sauvegardés dans centroids_file pour chaque valeur de k et
+    chaque source de données (source : fichier et filtres appliqués) : un nouveau calcul avec
+    le même k sur les mêmes données repart de la dernière solution. Sans source, rien n'est
+    sauvegardé ni repris.
+    """
+
+    keep_labels_on_sample = True
+
+    def __init__(self, n_clusters=10, batch_size=4096, max_epochs=5, tol=1.0, random_state=42,
+                 centroids_file=CENTROIDS_FILE, source=None, n_init=KMEANS_N_INIT):
+        self.n_clusters = n_clusters
+        self.n_init = n_init
+        self.batch_size = batch_size
+        self.max_epochs = max_epochs
+        # Déplacement maximal des centroïdes (en mètres) sur une passe pour considérer la convergence
+        self.tol = tol
+        self.random_state = random_state
+        self.centroids_file = centroids_file
+        self.source = source
+        self.origin = None
+        self.model = None
+        self.labels_ = None
+        self.inertia_ = None
+
+    # --- Centroïdes sauvegardés ---
+
+    def _saved_key(self):
+        """Nom des centroïdes sauvegardés pour ce k et cette source (None sans source)"""
+        if self.source is None or not self.centroids_file:
+            return None
+        digest = hashlib.sha1(repr(self.source).encode('utf-8')).hexdigest()[:16]
+        return f"k{self.n_clusters}_{digest}"
+
+    def saved_centroids(self):
+        """Centroïdes (lat, long) sauvegardés pour ce nombre de clusters et cette source, ou None"""
+        key = self._saved_key()
+        if key is None or not os.path.exists(self.centroids_file):
+            return None
+        with np.load(self.centroids_file) as saved:
+            return saved[key] if key in saved.files else None
+
+    def save_centroids(self):
+        key = self._saved_key()
+        if key is None:
+            return
+        saved = {}
+        if os.path.exists(self.centroids_file):
+            with np.load(self.centroids_file) as previous:
+                saved = {key: previous[key] for key in previous.files}
+        saved[key] = self.cluster_centers_
+        tmp_path = self.centroids_file + '.tmp.npz'
+        np.savez(tmp_path, **saved)
+        os.replace(tmp_path, self.centroids_file)
+
+    @property
+    def cluster_centers_(self):
+        """Centroïdes en degrés (lat, long)"""
+        return metres_to_degrees(self.model.cluster_centers_, self.origin)
+
+    # --- Apprentissage par lots ---
+
+    def _start(self, first_batch):
+        """Crée le modèle, initialisé avec les centroïdes sauvegardés s'il y en a"""
+        from sklearn.cluster import MiniBatchKMeans, kmeans_plusplus
+        from sklearn.metrics import pairwise_distances_argmin_min
+
+        if self.origin is None:
+            self.origin = first_batch.mean(axis=0)
+        warm = self.saved_centroids()
+        if warm is not None:
+            # Des centroïdes hors de l'étendue des données laisseraient des clusters vides
+            low, high = first_batch.min(axis=0), first_batch.max(axis=0)
+            if (warm.max(axis=0) < low).any() or (warm.min(axis=0) > high).any():
+                print("K-means : centroïdes sauvegardés hors de la zone des données, ignorés")
+                warm = None
+        if warm is not None:
+            print(f"K-means : reprise des {self.n_clusters} centroïdes sauvegardés")
+            init = project_to_metres(warm, self.origin)
+        else:
+            # partial_fit n'initialise qu'une fois (n_init est ignoré) : on garde la meilleure
+            # de n_init initialisations k-means++ sur le premier lot
+            points = project_to_metres(first_batch, self.origin)
+            best_inertia = np.inf
+            for seed in range(self.n_init):
+                centers, _ = kmeans_plusplus(points, self.n_clusters, random_state=self.random_state + seed)
+                inertia = np.square(pairwise_distances_argmin_min(points, centers)[1]).sum()
+                if inertia < best_inertia:
+                    init, best_inertia = centers, inertia
+        self.model = MiniBatchKMeans(n_clusters=self.n_clusters, init=init, n_init=1,
+                                     batch_size=self.batch_size, random_state=self.random_state)
+
+    def partial_fit(self, batch):
+        """Met à jour les centroïdes avec un lot de coordonnées (lat, long)"""
+        batch = np.asarray(batch, dtype=np.float64)
+        if self.model is None:
+            self._start(batch)
+        # Le premier lot doit contenir au moins n_clusters points pour l'initialisation
+        self.model.partial_fit(project_to_metres(batch, self.origin))
+        return self
+
+    def _iter_batches(self, X, rng):
+        order = rng.permutation(len(X))
+        first = max(self.batch_size, self.n_clusters)
+        yield X[order[:first]]
+        for start in range(first, len(X), self.batch_size):
+            yield X[order[start:start + self.batch_size]]
+
+    def _fit_epochs(self, batches):
+        """Enchaîne les passes jusqu'à ce que les centroïdes ne bougent plus (ou max_epochs)"""
+        for epoch in range(self.max_epochs):
+            previous = None if self.model is None else self.model.cluster_centers_.copy()
+            for batch in batches():
+                self.partial_fit(batch)
+            if previous is not None:
+                shift = np.sqrt(((self.model.cluster_centers_ - previous) ** 2).sum(axis=1)).max()
+                if shift < self.tol:
+                    break
+        self.save_centroids()
+        return self
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) < self.n_clusters:
+            raise ValueError(f"{len(X)} points pour {self.n_clusters} clusters")
+        self.model = None
+        rng = np.random.default_rng(self.random_state)
+        self._fit_epochs(lambda: self._iter_batches(X, rng))
+        self.labels_, self.inertia_ = self.assign(X)
+        return self
+
+    def fit_predict(self, X):
+        return self.fit(X).labels_
+
+    # --- Affectation ---
+
+    def assign(self, X):
+        """Labels (centroïde le plus proche) et inertie de tous les points, en une passe vectorisée"""
+        from sklearn.metrics import pairwise_distances_argmin_min
+
+        labels, distances = pairwise_distances_argmin_min(project_to_metres(X, self.origin),
+                                                          self.model.cluster_centers_)
+        return labels.astype(np.int64), float(np.square(distances).sum())
+
+    def predict(self, X):
+        return self.assign(np.asarray(X, dtype=np.float64))[0]
@@ -0,0 +1,221 @@
+import os
+import threading
+import pandas as pd
+
+# pyarrow est optionnel : sans lui on se contente du CSV
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Zone d'étude (Lyon) : coins ((lat_min, lon_min), (lat_max, lon_max)), gardée au nettoyage et tracée sur la carte
+STUDY_AREA = ((45.73, 4.79), (45.80, 4.90))
+
+# Colonnes du fichier nettoyé et leur type
+CLEANED_COLUMNS = ['id', 'user', 'lat', 'long', 'tags', 'title', 'date_taken']
+if pa is not None:
+    COLUMNAR_SCHEMA = pa.schema([
+        ('id', pa.int64()),
+        ('user', pa.dictionary(pa.int32(), pa.string())),
+        ('lat', pa.float64()),
+        ('long', pa.float64()),
+        ('tags', pa.string()),
+        ('title', pa.string()),
+        ('date_taken', pa.timestamp('us')),
+    ])
+else:
+    COLUMNAR_SCHEMA = None
+
+
+def columnar_path(csv_path):
+    """Chemin du fichier Parquet associé à un fichier CSV nettoyé"""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def has_fresh_columnar(csv_path):
+    """Vrai si le fichier Parquet existe et est au moins aussi récent que le CSV"""
+    if pq is None:
+        return False
+    parquet_path = columnar_path(csv_path)
+    if not os.path.exists(parquet_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)
+
+
+def apply_types(df):
+    """Convertit les colonnes d'un DataFrame lu depuis un CSV vers les types du fichier Parquet"""
+    if 'date_taken' in df.columns:
+        df['date_taken'] = pd.to_datetime(df['date_taken'], errors='coerce')
+    if 'user' in df.columns:
+        df['user'] = df['user'].astype('category')
+    for col in ('lat', 'long'):
+        if col in df.columns:
+            df[col] = df[col].astype('float64')
+    return df
+
+
+def load_dataset(path, columns=None, bounds=None, years=None):
+    """Charge un fichier de données en ne lisant que les colonnes demandées.
+
+    Le fichier Parquet typé est utilisé s'il est présent et à jour, sinon on lit le CSV.
+    Pour un dossier partitionné (geo_partitions), seules les partitions qui touchent la zone
+    bounds ((lat_min, lon_min), (lat_max, lon_max)) et les années years (début, fin) sont lues.
+    """
+    from geo_partitions import is_partitioned, load_partitioned
+
+    if is_partitioned(path):
+        return load_partitioned(path, bounds, years, columns)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    if has_fresh_columnar(path):
+        return pd.read_parquet(columnar_path(path), columns=columns)
+
+    df = pd.read_csv(path, usecols=columns, low_memory=False)
+    return apply_types(df)
+
+
+class ColumnarWriter:
+    """Écrit un fichier Parquet typé morceau par morceau (un row group par morceau)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.writer = None
+
+    def write(self, chunk):
+        table = pa.Table.from_pandas(chunk[CLEANED_COLUMNS], schema=COLUMNAR_SCHEMA, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.tmp_path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Abandonne l'écriture : le fichier temporaire est supprimé, l'ancien fichier est gardé"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def file_signature(path):
+    """Identifie une version d'un fichier de données : chemin, date de modification et taille.
+
+    La copie Parquet est incluse car c'est elle qui est lue quand elle est à jour. Pour un
+    dossier partitionné, c'est le manifeste (réécrit à chaque nettoyage) qui identifie la version.
+    """
+    from geo_partitions import MANIFEST_FILE
+
+    signature = []
+    for p in (path, columnar_path(path), os.path.join(path, MANIFEST_FILE)):
+        if os.path.isfile(p):
+            stat = os.stat(p)
+            signature.append((os.path.abspath(p), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class DatasetManager:
+    """Garde en mémoire le fichier de données sélectionné et les colonnes dérivées.
+
+    Le fichier n'est relu que si son chemin, sa date de modification ou sa taille change.
+    Les actions de l'interface reçoivent des vues en lecture seule du DataFrame chargé.
+    Le gestionnaire est partagé entre le thread de Tk et celui des traitements. lock ne
+    protège que l'état (jamais tenu pendant une lecture ou un calcul) ; un fichier ou une
+    donnée dérivée n'est lu ou calculé qu'une fois même si les deux threads le demandent.
+    Le thread de Tk utilise peek, qui n'attend jamais.
+    """
+
+    def __init__(self):
+        self.signature = None
+        self.df = None
+        self.cache = {}
+        # Zone et années à charger depuis un dossier partitionné (None = tout)
+        self.bounds = None
+        self.years = None
+        self.lock = threading.RLock()
+        # Un verrou par version du fichier en cours de lecture et par donnée dérivée en cours de calcul
+        self.loading = {}
+        self.building = {}
+
+    def set_scope(self, bounds=None, years=None):
+        """Restreint le chargement d'un dossier partitionné à une zone et des années (sans effet sur un fichier)"""
+        with self.lock:
+            self.bounds = None if bounds is None else tuple(tuple(float(v) for v in corner) for corner in bounds)
+            self.years = None if years is None else (int(years[0]), int(years[1]))
+
+    def signature_of(self, path):
+        """Version du fichier (et, pour un dossier partitionné, zone et années chargées)"""
+        signature = file_signature(path)
+        if os.path.isdir(path):
+            signature += ((self.bounds, self.years),)
+        return signature
+
+    def load(self, path):
+        """Charge le fichier s'il n'est pas déjà en mémoire et renvoie le DataFrame complet"""
+        with self.lock:
+            signature = self.signature_of(path)
+            if self.df is not None and signature == self.signature:
+                return self.df
+            bounds, years = self.bounds, self.years
+            loading = self.loading.setdefault(signature, threading.Lock())
+        with loading:
+            with self.lock:
+                if self.df is not None and signature == self.signature:
+                    return self.df
+            print(f"Chargement de {path}...")
+            # L'index sert d'identifiant de ligne pour les structures dérivées
+            df = load_dataset(path, bounds=bounds, years=years).reset_index(drop=True)
+            with self.lock:
+                self.df = df
+                self.signature = signature
+                self.cache = {}
+                self.building = {}
+                self.loading.pop(signature, None)
+            return df
+
+    def peek(self, path, name=None):
+        """DataFrame (ou donnée dérivée name) de path s'il est déjà en mémoire, None sinon.
+
+        Ne lit rien et n'attend pas un chargement en cours : pour le thread de Tk.
+        """
+        with self.lock:
+            if self.df is None or self.signature_of(path) != self.signature:
+                return None
+            return self.df if name is None else self.cache.get(name)
+
+    def view(self, path, columns=None):
+        """Renvoie une vue des colonnes demandées, sans relire le fichier"""
+        df = self.load(path)
+        if columns is not None:
+            return df[columns]
+        return df.copy(deep=False)
+
+    def derived(self, path, name, builder):
+        """Renvoie une donnée dérivée du DataFrame, calculée une seule fois par version du fichier"""
+        df = self.load(path)
+        with self.lock:
+            if df is not self.df:
+                # Rechargé entre temps : valeur calculée pour le df demandé, sans la garder
+                cache, building = None, threading.Lock()
+            else:
+                cache = self.cache
+                if name in cache:
+                    return cache[name]
+                building = self.building.setdefault(name, threading.Lock())
+        with building:
+            with self.lock:
+                if cache is not None and name in cache:
+                    return cache[name]
+            value = builder(df)
+            with self.lock:
+                if cache is not None and cache is self.cache:
+                    cache[name] = value
+            return value
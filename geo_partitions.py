@@ -0,0 +1,171 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from data_loader import CLEANED_COLUMNS, COLUMNAR_SCHEMA, pa, pq
+
+# Fichier décrivant les partitions d'un dossier (écrit en dernier : sa présence signale un dossier complet)
+MANIFEST_FILE = 'manifest.json'
+# Longueur des préfixes de geohash (4 caractères : cellules d'environ 39 km x 20 km)
+GEOHASH_PRECISION = 4
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def _require_pyarrow():
+    """Les fichiers des partitions sont au format Parquet : pyarrow est indispensable pour les lire ou les écrire"""
+    if pa is None:
+        raise ImportError("pyarrow est nécessaire pour lire ou écrire un dossier partitionné "
+                          "(pip install pyarrow)")
+
+
+def _bit_split(precision):
+    """Nombre de bits de longitude et de latitude d'un geohash de precision caractères"""
+    n_bits = 5 * precision
+    return (n_bits + 1) // 2, n_bits // 2
+
+
+def geohash_codes(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash de chaque point sous forme d'entier (5 bits par caractère)"""
+    lon_bits, lat_bits = _bit_split(precision)
+    lat_idx = np.clip(((np.asarray(lat) + 90) / 180 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    lon_idx = np.clip(((np.asarray(lon) + 180) / 360 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    # Bits entrelacés en commençant par la longitude
+    code = np.zeros(len(lat_idx), dtype=np.int64)
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            bit = (lon_idx >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_idx >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+    return code
+
+
+def geohash_string(code, precision=GEOHASH_PRECISION):
+    """Texte d'un geohash entier ('u05k' pour Lyon)"""
+    return ''.join(BASE32[(int(code) >> 5 * (precision - 1 - k)) & 31] for k in range(precision))
+
+
+def geohash_bounds(geohash):
+    """Rectangle ((lat_min, lon_min), (lat_max, lon_max)) couvert par un geohash"""
+    precision = len(geohash)
+    lon_bits, lat_bits = _bit_split(precision)
+    code = 0
+    for char in geohash:
+        code = (code << 5) | BASE32.index(char)
+    lat_idx = lon_idx = 0
+    for i in range(5 * precision):
+        bit = (code >> (5 * precision - 1 - i)) & 1
+        if i % 2 == 0:
+            lon_idx = (lon_idx << 1) | bit
+        else:
+            lat_idx = (lat_idx << 1) | bit
+    lat_step, lon_step = 180 / (1 << lat_bits), 360 / (1 << lon_bits)
+    return ((lat_idx * lat_step - 90, lon_idx * lon_step - 180),
+            ((lat_idx + 1) * lat_step - 90, (lon_idx + 1) * lon_step - 180))
+
+
+class PartitionedWriter:
+    """Écrit le jeu nettoyé dans un dossier de fichiers Parquet, un sous-dossier par partition.
+
+    Les partitions sont les préfixes de geohash (geohash=u05k/) et, si by_year, les années
+    (geohash=u05k/year=2015/). Chaque morceau écrit ajoute au plus un fichier par partition.
+    Le dossier est écrit à côté puis mis en place à la fermeture.
+    """
+
+    def __init__(self, root, precision=GEOHASH_PRECISION, by_year=True):
+        _require_pyarrow()
+        self.root = root
+        self.tmp_root = root + '.tmp'
+        self.precision = precision
+        self.by_year = by_year
+        self.partitions = {}
+        self.n_chunks = 0
+        shutil.rmtree(self.tmp_root, ignore_errors=True)
+        os.makedirs(self.tmp_root)
+
+    def write(self, chunk):
+        if len(chunk) == 0:
+            return
+        codes = geohash_codes(chunk['lat'].to_numpy(), chunk['long'].to_numpy(), self.precision)
+        years = chunk['date_taken'].dt.year.to_numpy() if self.by_year else np.zeros(len(chunk), dtype=np.int64)
+        for (code, year), part in chunk.groupby([codes, years], sort=True):
+            geohash = geohash_string(code, self.precision)
+            year = int(year) if self.by_year else None
+            directory = f"geohash={geohash}" + (f"/year={year}" if self.by_year else "")
+            os.makedirs(os.path.join(self.tmp_root, directory), exist_ok=True)
+            file = f"{directory}/part-{self.n_chunks:05d}.parquet"
+            table = pa.Table.from_pandas(part[CLEANED_COLUMNS], schema=COLUMNAR_SCHEMA, preserve_index=False)
+            pq.write_table(table, os.path.join(self.tmp_root, file))
+
+            entry = self.partitions.setdefault((geohash, year), {'geohash': geohash, 'year': year,
+                                                                 'rows': 0, 'files': []})
+            entry['rows'] += len(part)
+            entry['files'].append(file)
+        self.n_chunks += 1
+
+    def close(self):
+        manifest = {'precision': self.precision, 'by_year': self.by_year,
+                    'partitions': sorted(self.partitions.values(), key=lambda p: (p['geohash'], p['year'] or 0))}
+        with open(os.path.join(self.tmp_root, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.replace(self.tmp_root, self.root)
+
+    def abort(self):
+        """Abandonne l'écriture : les partitions déjà écrites sont supprimées, l'ancien dossier est gardé"""
+        shutil.rmtree(self.tmp_root, ignore_errors=True)
+
+
+def is_partitioned(path):
+    """Vrai si path est un dossier écrit par PartitionedWriter"""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def read_manifest(root):
+    with open(os.path.join(root, MANIFEST_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def select_partitions(manifest, bounds=None, years=None):
+    """Partitions qui touchent une zone ((lat_min, lon_min), (lat_max, lon_max)) et des années (début, fin)"""
+    selected = []
+    for partition in manifest['partitions']:
+        if bounds is not None:
+            (lat_min, lon_min), (lat_max, lon_max) = geohash_bounds(partition['geohash'])
+            (q_lat_min, q_lon_min), (q_lat_max, q_lon_max) = bounds
+            if lat_max < q_lat_min or lat_min > q_lat_max or lon_max < q_lon_min or lon_min > q_lon_max:
+                continue
+        if years is not None and partition['year'] is not None:
+            if not years[0] <= partition['year'] <= years[1]:
+                continue
+        selected.append(partition)
+    return selected
+
+
+def load_partitioned(root, bounds=None, years=None, columns=None):
+    """Charge les lignes d'une zone et d'une période en ne lisant que les partitions concernées.
+
+    Les lignes des partitions lues sont ensuite filtrées exactement sur la zone et les années
+    (si les colonnes nécessaires sont chargées).
+    """
+    _require_pyarrow()
+    partitions = select_partitions(read_manifest(root), bounds, years)
+    files = [os.path.join(root, file) for partition in partitions for file in partition['files']]
+    print(f"{len(partitions)} partitions lues ({sum(p['rows'] for p in partitions)} lignes)")
+    if files:
+        table = pa.concat_tables([pq.read_table(file, columns=columns) for file in files])
+    else:
+        table = COLUMNAR_SCHEMA.empty_table()
+        if columns is not None:
+            table = table.select(columns)
+    df = table.to_pandas()
+
+    keep = np.ones(len(df), dtype=bool)
+    if bounds is not None and {'lat', 'long'} <= set(df.columns):
+        (lat_min, lon_min), (lat_max, lon_max) = bounds
+        keep &= df['lat'].between(lat_min, lat_max).to_numpy() & df['long'].between(lon_min, lon_max).to_numpy()
+    if years is not None and 'date_taken' in df.columns:
+        keep &= df['date_taken'].dt.year.between(years[0], years[1]).to_numpy()
+    return df[keep].reset_index(drop=True)
+
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from clustering import project_to_metres, metres_to_degrees
+from tiles import dominant_cluster
+
+SQRT3 = np.sqrt(3)
+# Sommets d'un hexagone à pointe en haut de rayon 1, et d'un carré de côté 1 centré
+HEX_CORNERS = np.array([[np.cos(a), np.sin(a)] for a in np.radians(np.arange(30, 390, 60))])
+SQUARE_CORNERS = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])
+
+
+def hex_cells(points, size):
+    """Hexagone (coordonnées axiales q, r) de chaque point, size = distance entre deux centres voisins"""
+    radius = size / SQRT3
+    q = (SQRT3 / 3 * points[:, 0] - points[:, 1] / 3) / radius
+    r = (2 / 3 * points[:, 1]) / radius
+    # Arrondi en coordonnées cubiques : corriger la composante dont l'arrondi s'écarte le plus
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def hex_centers(q, r, size):
+    radius = size / SQRT3
+    return np.column_stack([radius * SQRT3 * (q + r / 2), radius * 1.5 * r])
+
+
+def aggregate_grid(df, size=100.0, shape='hex'):
+    """Agrège les points clusterisés sur une grille hexagonale ou carrée de pas size (en mètres).
+
+    Renvoie un DataFrame avec une ligne par cellule occupée : nombre de photos, nombre
+    d'utilisateurs distincts, cluster dominant et sommets (lat, long) du polygone de la cellule.
+    """
+    coords = df[['lat', 'long']].to_numpy(dtype=np.float64)
+    origin = coords.mean(axis=0)
+    points = project_to_metres(coords, origin)
+    if shape == 'hex':
+        a, b = hex_cells(points, size)
+    else:
+        a, b = np.floor(points / size).astype(np.int64).T
+
+    # Identifiant entier de chaque cellule occupée
+    a_min, b_min = a.min(), b.min()
+    width = b.max() - b_min + 1
+    cell_keys, cell_idx, counts = np.unique((a - a_min) * width + (b - b_min),
+                                            return_inverse=True, return_counts=True)
+    n_cells = len(cell_keys)
+
+    # Utilisateurs distincts : couples (cellule, utilisateur) uniques
+    user_codes, user_vocab = pd.factorize(df['user'].to_numpy(dtype=object))
+    pairs = np.unique(cell_idx * len(user_vocab) + user_codes)
+    users = np.bincount(pairs // len(user_vocab), minlength=n_cells)
+
+    dominant = dominant_cluster(cell_idx, df['cluster'].to_numpy(dtype=np.int64), n_cells)
+
+    # Sommets des polygones, calculés une fois par cellule occupée
+    cell_a = cell_keys // width + a_min
+    cell_b = cell_keys % width + b_min
+    if shape == 'hex':
+        centers = hex_centers(cell_a, cell_b, size)
+        corners = HEX_CORNERS * (size / SQRT3)
+    else:
+        centers = (np.column_stack([cell_a, cell_b]) + 0.5) * size
+        corners = SQUARE_CORNERS * size
+    vertices = centers[:, None, :] + corners[None, :, :]
+    vertices = metres_to_degrees(vertices.reshape(-1, 2), origin).reshape(n_cells, len(corners), 2)
+
+    return pd.DataFrame({
+        'count': counts,
+        'users': users,
+        'cluster': dominant,
+        'vertices': list(vertices),
+    })
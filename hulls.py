@@ -0,0 +1,153 @@
+import numpy as np
+from scipy.spatial import ConvexHull, Delaunay, QhullError
+from clustering import project_to_metres, metres_to_degrees
+
+# Formes disponibles pour les polygones des clusters
+HULL_MODES = ("convexe", "concave")
+
+
+def _douglas_peucker(points, tolerance):
+    """Masque des sommets gardés d'une polyligne ouverte (extrémités toujours gardées)"""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        dx, dy = b - a
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / norm
+        i = np.argmax(dist)
+        if dist[i] > tolerance:
+            k = start + 1 + i
+            keep[k] = True
+            stack.append((start, k))
+            stack.append((k, end))
+    return keep
+
+
+def simplify_ring(ring, tolerance):
+    """Simplifie un anneau fermé (sommets en mètres, sans répéter le premier) par Douglas-Peucker.
+
+    L'anneau est coupé en deux chaînes entre le premier sommet et le sommet le plus éloigné,
+    simplifiées séparément. Un anneau qui tomberait sous 3 sommets est renvoyé tel quel.
+    """
+    n = len(ring)
+    if tolerance <= 0 or n <= 3:
+        return ring
+    far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    closed = np.vstack([ring, ring[:1]])
+    keep = np.zeros(n, dtype=bool)
+    keep[:far + 1] |= _douglas_peucker(closed[:far + 1], tolerance)
+    keep[far:] |= _douglas_peucker(closed[far:], tolerance)[:-1]
+    return ring[keep] if keep.sum() >= 3 else ring
+
+
+def _convex_ring(points, degenerate):
+    """Enveloppe convexe (sommets dans l'ordre) ; joggle de Qhull seulement pour les cas dégénérés"""
+    if not degenerate:
+        try:
+            return points[ConvexHull(points).vertices]
+        except QhullError:
+            pass  # points alignés : on retente avec le joggle
+    return points[ConvexHull(points, qhull_options='QJ').vertices]
+
+
+def _concave_rings(points, alpha):
+    """Contours extérieurs de l'alpha-shape : triangles de Delaunay de rayon circonscrit <= alpha.
+
+    Renvoie une liste d'anneaux (un par composante, les trous sont ignorés), vide si aucun
+    triangle n'est gardé.
+    """
+    triangles = Delaunay(points).simplices
+    a, b, c = (points[triangles[:, i]] for i in range(3))
+    # Orienter tous les triangles dans le sens direct
+    cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    flip = cross < 0
+    triangles[flip] = triangles[flip][:, [0, 2, 1]]
+    ab, bc, ca = np.hypot(*(b - a).T), np.hypot(*(c - b).T), np.hypot(*(a - c).T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radius = ab * bc * ca / (2 * np.abs(cross))
+    triangles = triangles[radius <= alpha]
+    if not len(triangles):
+        return []
+
+    # Arêtes du bord : arêtes orientées dont l'arête inverse n'appartient à aucun triangle gardé
+    start = triangles.ravel()
+    end = triangles[:, [1, 2, 0]].ravel()
+    n = len(points)
+    border = ~np.isin(start * n + end, end * n + start)
+    start, end = start[border], end[border]
+
+    # Parcours des contours (le sens direct laisse l'intérieur à gauche)
+    outgoing = {}
+    for e, s in enumerate(start.tolist()):
+        outgoing.setdefault(s, []).append(e)
+    used = np.zeros(len(start), dtype=bool)
+    rings = []
+    for first in range(len(start)):
+        if used[first]:
+            continue
+        ring, e = [], first
+        while not used[e]:
+            used[e] = True
+            ring.append(start[e])
+            candidates = [f for f in outgoing[end[e]] if not used[f]]
+            if not candidates:
+                break
+            e = candidates[0]
+        ring = points[ring]
+        x, y = ring[:, 0], ring[:, 1]
+        area = 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+        if len(ring) >= 3 and area > 0:
+            rings.append(ring)
+    return rings
+
+
+def cluster_hulls(coords, partition, mode="convexe", tolerance=5.0, alpha=100.0):
+    """Polygones de tous les clusters, calculés en une passe sur la partition.
+
+    coords    : (lat, long) des points, dans l'ordre de la partition
+    partition : ClusterPartition des labels (le bruit, -1, n'a pas de polygone)
+    mode      : "convexe" (enveloppe convexe) ou "concave" (alpha-shape de paramètre alpha, en mètres)
+    tolerance : tolérance de simplification des contours, en mètres (0 = aucune)
+
+    Les points sont projetés en mètres et regroupés par cluster une seule fois ; chaque
+    cluster est une tranche contiguë. Renvoie un dictionnaire cluster -> liste d'anneaux
+    (sommets (lat, long)) ; les clusters de moins de 3 points sont ignorés.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    if not len(coords):
+        return {}
+    origin = coords.mean(axis=0)
+    points = project_to_metres(coords, origin)[partition.positions]
+
+    # Étendue de chaque cluster, pour repérer sans Qhull les clusters réduits à un point ou
+    # à une droite horizontale ou verticale
+    starts = partition.offsets[:-1]
+    extent = np.maximum.reduceat(points, starts) - np.minimum.reduceat(points, starts)
+    degenerate = (extent == 0).any(axis=1)
+    sizes = partition.sizes()
+
+    hulls = {}
+    for i, cluster_id in enumerate(partition.clusters.tolist()):
+        if cluster_id == -1 or sizes[i] < 3:
+            continue
+        cluster_points = points[partition.offsets[i]:partition.offsets[i + 1]]
+        rings = []
+        if mode == "concave" and not degenerate[i]:
+            try:
+                rings = _concave_rings(cluster_points, alpha)
+            except QhullError:
+                rings = []
+        if not rings:
+            # Mode convexe, ou alpha trop petit pour garder un triangle
+            rings = [_convex_ring(cluster_points, degenerate[i])]
+        hulls[cluster_id] = [metres_to_degrees(simplify_ring(ring, tolerance), origin) for ring in rings]
+    return hulls
@@ -3,18 +3,28 @@ from tkinter import ttk, messagebox, filedialog
 import map_visualization
 import pandas as pd
 from pathlib import Path
-from sklearn.cluster import DBSCAN, KMeans
+from sklearn.cluster import KMeans
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.metrics import silhouette_score
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkcalendar import DateEntry
 from datetime import datetime
-import threading
 import webbrowser
 import seaborn as sns
 from matplotlib.dates import DateFormatter
 import plotly.express as px
 import os
+import threading
+from data_loader import DatasetManager, STUDY_AREA, file_signature
+from tag_index import TagIndex, query_terms
+from time_index import TimeIndex, intersect_rows
+from spatial_index import SpatialIndex, parse_region
+from geo_partitions import is_partitioned, MANIFEST_FILE
+from tokenization import TokenizedDataset
+from clustering import GeoDBSCAN, GridDBSCAN, HierarchicalDBSCAN, StreamingKMeans
+from kmeans_sweep import KMeansSweep, SILHOUETTE_SAMPLE
+from jobs import JobRunner, JobCancelled
+from hulls import HULL_MODES
 
 class DataMiningInterface:
     def __init__(self, root):
@@ -27,32 +37,47 @@ class DataMiningInterface:
         
         # Valeurs par défaut
         self.default_values = {
-            'eps': "0.0003",
+            'eps': "33",  # en mètres (~0.0003°)
+            'max_eps': "50",  # rayon du graphe des voisins mis en cache
+            'min_cluster_size': "15",
+            'cut': "0",  # coupe de la hiérarchie en mètres (0 = automatique)
             'min_samples': "5",
             'n_clusters': "10",
+            'silhouette_sample': str(SILHOUETTE_SAMPLE),
             'n_points': "10000",
             'n_common_tags': "100",
             'data_file': "flickr_data_cleaned.csv",
             'algo': "DBSCAN",
-            'display_points': "2000"
+            'display_points': "2000",
+            'grid_size': "100",  # pas de la grille de densité en mètres
+            'hull_tolerance': "5",  # simplification des polygones en mètres
+            'hull_alpha': "100",  # rayon maximal des triangles du mode concave en mètres
+            'region': "; ".join(f"{lat}, {lon}" for lat, lon in STUDY_AREA)  # zone d'étude complète
         }
         
+        # Données chargées une seule fois et partagées par toutes les actions
+        self.dataset = DatasetManager()
+        
         # Initialiser les dates min et max
         self.start_year = 2010
         self.end_year = 2018
         try:
             if Path(self.default_values['data_file']).exists():
-                df = pd.read_csv(self.default_values['data_file'], low_memory=False)
-                df['date_taken'] = pd.to_datetime(df['date_taken'])
-                self.start_year = df['date_taken'].dt.year.min()
-                self.end_year = df['date_taken'].dt.year.max()
+                index = self.time_index(self.default_values['data_file'])
+                if len(index.keys):
+                    self.start_year = int(index.first().astype('datetime64[Y]').astype(int)) + 1970
+                    self.end_year = int(index.last().astype('datetime64[Y]').astype(int)) + 1970
         except Exception as e:
             print(f"Erreur lors de l'initialisation des dates: {e}")
         
         # Variables pour les paramètres
         self.eps_var = tk.StringVar(value=self.default_values['eps'])
         self.min_samples_var = tk.StringVar(value=self.default_values['min_samples'])
+        self.max_eps_var = tk.StringVar(value=self.default_values['max_eps'])
+        self.min_cluster_size_var = tk.StringVar(value=self.default_values['min_cluster_size'])
+        self.cut_var = tk.StringVar(value=self.default_values['cut'])
         self.n_clusters_var = tk.StringVar(value=self.default_values['n_clusters'])
+        self.silhouette_sample_var = tk.StringVar(value=self.default_values['silhouette_sample'])
         self.n_points_var = tk.StringVar(value=self.default_values['n_points'])
         self.n_common_tags_var = tk.StringVar(value=self.default_values['n_common_tags'])
         self.data_file_path = tk.StringVar(value=self.default_values['data_file'])
@@ -60,6 +85,12 @@ class DataMiningInterface:
         self.search_var = tk.StringVar()
         self.keep_search_tag_var = tk.BooleanVar(value=False)
         self.display_points_var = tk.StringVar(value=self.default_values['display_points'])
+        self.cluster_all_var = tk.BooleanVar(value=False)
+        
+        # DBSCAN métrique : l'index spatial est conservé d'une génération à l'autre
+        self.geo_dbscan = GeoDBSCAN()
+        # HDBSCAN : la hiérarchie est conservée, seules les coupes changent
+        self.hdbscan = HierarchicalDBSCAN()
         
         # Variables pour les labels
         self.n_clusters_label = None
@@ -76,11 +107,35 @@ class DataMiningInterface:
         self.date_start_var = tk.StringVar()
         self.date_end_var = tk.StringVar()
         
-        # Stocker les données des clusters
-        self.cluster_data = None
+        # Zone analysée : "lat, long; lat, long" (rectangle) ou trois sommets ou plus (polygone)
+        self.region_var = tk.StringVar(value=self.default_values['region'])
+        self.use_region_var = tk.BooleanVar(value=False)
+        
+        # Nombre de photos par cluster et par jour de la dernière carte
+        self.time_cube = None
+        
+        # Génération de la carte en arrière-plan : une génération annulée peut encore finir son
+        # clustering pendant que la suivante démarre
+        self.jobs = JobRunner(self.root)
+        # Les variables de map_visualization et les fichiers de la carte : une génération à la fois
+        self.render_lock = threading.Lock()
+        # Génération qui utilise self.geo_dbscan / self.hdbscan
+        self.algo_lock = threading.Lock()
+        self.algo_owners = {}
+        # Chargement du fichier sélectionné en arrière-plan (le thread de Tk n'attend jamais une lecture)
+        self.preload = JobRunner(self.root)
+        self.preloading = None
+        self.loading_window = None
         
         # Ajouter une variable pour l'affichage des points
         self.show_points_var = tk.BooleanVar(value=True)
+        self.point_display_var = tk.StringVar(value="points")
+        self.grid_size_var = tk.StringVar(value=self.default_values['grid_size'])
+        
+        # Forme et simplification des polygones des clusters
+        self.hull_mode_var = tk.StringVar(value="convexe")
+        self.hull_tolerance_var = tk.StringVar(value=self.default_values['hull_tolerance'])
+        self.hull_alpha_var = tk.StringVar(value=self.default_values['hull_alpha'])
         
         # Ajouter la variable pour les graphiques temporels
         self.show_time_plots_var = tk.BooleanVar(value=True)
@@ -105,16 +160,15 @@ class DataMiningInterface:
         search_entry.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
         ttk.Button(search_frame, text="Rechercher", command=self.filter_by_tag).grid(row=0, column=2, padx=5)
         
-        # Suggestions de tags
-        suggestions_frame = ttk.Frame(search_frame)
-        suggestions_frame.grid(row=1, column=0, columnspan=3, pady=2)
+        # Syntaxe : tag* (préfixe), "tag" (exact), & (ET), | (OU)
+        ttk.Label(search_frame, text='Ex : insa & nuit, lumi* | "confluence"',
+                  foreground='gray').grid(row=2, column=0, columnspan=3)
         
-        ttk.Label(suggestions_frame, text="Suggestions:").grid(row=0, column=0, padx=2)
-        
-        suggestions = ["lumieres", "insa", "bellecour", "confluence"]
-        for i, tag in enumerate(suggestions):
-            ttk.Button(suggestions_frame, text=tag, 
-                      command=lambda t=tag: self.apply_suggestion(t)).grid(row=0, column=i+1, padx=2)
+        # Suggestions de tags, mises à jour pendant la saisie
+        self.suggestions_frame = ttk.Frame(search_frame)
+        self.suggestions_frame.grid(row=1, column=0, columnspan=3, pady=2)
+        self.refresh_suggestions()
+        self.search_var.trace_add('write', lambda *args: self.refresh_suggestions())
         
         # Case à cocher pour conserver le tag recherché
         ttk.Checkbutton(file_frame, text="Retirer recherché de la liste des tags exclus", 
@@ -127,7 +181,11 @@ class DataMiningInterface:
         
         # Bouton pour sélectionner le fichier
         ttk.Button(file_frame, text="Choisir un fichier", 
-                  command=self.select_file).grid(row=3, column=0, columnspan=3, pady=5)
+                  command=self.select_file).grid(row=3, column=0, pady=5)
+        
+        # Dossier partitionné par zone : seules les partitions de la zone et de la période sont lues
+        ttk.Button(file_frame, text="Choisir un dossier partitionné",
+                  command=self.select_directory).grid(row=3, column=1, columnspan=2, pady=5)
         
         # Ajouter un frame pour la sélection de dates
         date_frame = ttk.LabelFrame(file_frame, text="Filtrer par période", padding="5")
@@ -156,6 +214,17 @@ class DataMiningInterface:
         ttk.Checkbutton(date_frame, text="Activer le filtre temporel", 
                        variable=self.use_date_filter).grid(row=0, column=4, padx=5)
         
+        # Restreindre l'analyse à une zone (rectangle ou polygone)
+        region_frame = ttk.LabelFrame(file_frame, text="Filtrer par zone", padding="5")
+        region_frame.grid(row=5, column=0, columnspan=3, pady=5, sticky="ew")
+        
+        ttk.Label(region_frame, text="Zone (lat, long; ...):").grid(row=0, column=0, padx=5)
+        ttk.Entry(region_frame, textvariable=self.region_var, width=40).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Checkbutton(region_frame, text="Activer le filtre spatial",
+                       variable=self.use_region_var).grid(row=0, column=2, padx=5)
+        ttk.Label(region_frame, text="2 points : coins d'un rectangle, 3 points ou plus : polygone",
+                  foreground='gray').grid(row=1, column=0, columnspan=3)
+        
     def create_parameters_frame(self):
         # Frame principal pour tous les paramètres
         main_params_frame = ttk.Frame(self.root)
@@ -168,7 +237,9 @@ class DataMiningInterface:
         # Choix de l'algorithme
         ttk.Label(clustering_frame, text="Algorithme:").grid(row=0, column=0, sticky="w")
         algo_combo = ttk.Combobox(clustering_frame, textvariable=self.algo_var, 
-                                values=["DBSCAN", "K-means"], state="readonly")
+                                values=["DBSCAN", "DBSCAN approché (grille)", "HDBSCAN (hiérarchique)", "K-means",
+                                        "K-means (mini-lots)"],
+                                state="readonly")
         algo_combo.grid(row=0, column=1, padx=5, columnspan=2)
         algo_combo.bind('<<ComboboxSelected>>', self.on_algo_change)
         
@@ -177,13 +248,39 @@ class DataMiningInterface:
         self.dbscan_frame.grid(row=1, column=0, columnspan=3, pady=5)
         
         # Epsilon avec champ de texte
-        ttk.Label(self.dbscan_frame, text="Epsilon:").grid(row=0, column=0, sticky="w")
+        ttk.Label(self.dbscan_frame, text="Epsilon (m):").grid(row=0, column=0, sticky="w")
         ttk.Entry(self.dbscan_frame, textvariable=self.eps_var, width=10).grid(row=0, column=1, padx=5)
         
         # Min Samples avec champ de texte
         ttk.Label(self.dbscan_frame, text="Min Samples:").grid(row=1, column=0, sticky="w")
         ttk.Entry(self.dbscan_frame, textvariable=self.min_samples_var, width=10).grid(row=1, column=1, padx=5)
         
+        # Rayon du graphe des voisins : tout epsilon plus petit se recalcule sans nouvelle recherche
+        ttk.Label(self.dbscan_frame, text="Epsilon max (m):").grid(row=2, column=0, sticky="w")
+        ttk.Entry(self.dbscan_frame, textvariable=self.max_eps_var, width=10).grid(row=2, column=1, padx=5)
+        
+        # Frame pour les paramètres HDBSCAN
+        self.hdbscan_frame = ttk.Frame(clustering_frame)
+        self.hdbscan_frame.grid(row=1, column=0, columnspan=3, pady=5)
+        
+        ttk.Label(self.hdbscan_frame, text="Taille min. cluster:").grid(row=0, column=0, sticky="w")
+        ttk.Entry(self.hdbscan_frame, textvariable=self.min_cluster_size_var, width=10).grid(row=0, column=1, padx=5)
+        
+        ttk.Label(self.hdbscan_frame, text="Min Samples:").grid(row=1, column=0, sticky="w")
+        ttk.Entry(self.hdbscan_frame, textvariable=self.min_samples_var, width=10).grid(row=1, column=1, padx=5)
+        
+        # Niveau de coupe de la hiérarchie (0 = sélection automatique)
+        ttk.Label(self.hdbscan_frame, text="Coupe (m):").grid(row=2, column=0, sticky="w")
+        self.cut_scale = ttk.Scale(self.hdbscan_frame,
+                                   from_=0,
+                                   to=200,
+                                   orient="horizontal",
+                                   length=150,
+                                   command=lambda v: self.update_cut(v))
+        self.cut_scale.grid(row=2, column=1, padx=5, sticky="ew")
+        self.cut_label = ttk.Label(self.hdbscan_frame, text="auto")
+        self.cut_label.grid(row=2, column=2, padx=5)
+        
         # Frame pour les paramètres K-means
         self.kmeans_frame = ttk.Frame(clustering_frame)
         self.kmeans_frame.grid(row=1, column=0, columnspan=3, pady=5)
@@ -249,6 +346,10 @@ class DataMiningInterface:
         
         self.k_range_label.grid(row=1, column=2, padx=5)
         
+        # Taille de l'échantillon stratifié pour le score silhouette
+        ttk.Label(self.kmeans_frame, text="Échantillon silhouette:").grid(row=2, column=0, sticky="w")
+        ttk.Entry(self.kmeans_frame, textvariable=self.silhouette_sample_var, width=10).grid(row=2, column=1, padx=5, sticky="w")
+        
         # Nombre de points pour le clustering avec slider
         ttk.Label(clustering_frame, text="Nombre de points pour clustering:").grid(row=4, column=0, sticky="w")
         n_points_scale = ttk.Scale(clustering_frame,
@@ -261,6 +362,10 @@ class DataMiningInterface:
         n_points_scale.set(int(self.default_values['n_points']))
         self.n_points_label.grid(row=4, column=2, padx=5)
         
+        # Clusteriser tout le jeu de données sans échantillonnage
+        ttk.Checkbutton(clustering_frame, text="Clusteriser tous les points", 
+                       variable=self.cluster_all_var).grid(row=5, column=0, columnspan=3, sticky="w")
+        
         # Frame pour les paramètres d'affichage
         display_frame = ttk.LabelFrame(main_params_frame, text="Paramètres d'affichage", padding="10")
         display_frame.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
@@ -272,7 +377,7 @@ class DataMiningInterface:
         ttk.Label(points_display_frame, text="Nombre de points à afficher:").grid(row=0, column=0, sticky="w")
         display_points_scale = ttk.Scale(points_display_frame,
                                        from_=100,
-                                       to=5000,
+                                       to=200000,
                                        orient="horizontal",
                                        length=200,
                                        command=lambda v: self.update_display_points(v))
@@ -282,7 +387,18 @@ class DataMiningInterface:
         
         # Case à cocher pour afficher/masquer les points
         ttk.Checkbutton(points_display_frame, text="Afficher les points", 
-                       variable=self.show_points_var).grid(row=1, column=0, columnspan=3, pady=2)
+                       variable=self.show_points_var).grid(row=1, column=0, pady=2)
+        
+        # Mode d'affichage des points : un à un (canvas) ou densité pré-rendue en tuiles
+        ttk.Combobox(points_display_frame,
+                     textvariable=self.point_display_var,
+                     values=["points", "tuiles", "hexagones", "carrés"],
+                     state="readonly",
+                     width=10).grid(row=1, column=1, padx=5, sticky="w")
+        
+        # Pas de la grille de densité (modes hexagones et carrés)
+        ttk.Label(points_display_frame, text="Cellule (m):").grid(row=2, column=0, sticky="w")
+        ttk.Entry(points_display_frame, textvariable=self.grid_size_var, width=8).grid(row=2, column=1, padx=5, sticky="w")
         
         # Tags communs à exclure
         tags_frame = ttk.Frame(display_frame)
@@ -316,6 +432,21 @@ class DataMiningInterface:
                                     width=10)
         time_grouping.grid(row=0, column=2, padx=5)
         
+        # Polygones des clusters : enveloppe convexe ou concave (alpha-shape), simplifiés
+        hull_frame = ttk.Frame(display_frame)
+        hull_frame.grid(row=3, column=0, columnspan=3, sticky="ew", pady=5)
+        
+        ttk.Label(hull_frame, text="Polygones:").grid(row=0, column=0, padx=5, sticky="w")
+        ttk.Combobox(hull_frame,
+                     textvariable=self.hull_mode_var,
+                     values=list(HULL_MODES),
+                     state="readonly",
+                     width=10).grid(row=0, column=1, padx=5, sticky="w")
+        ttk.Label(hull_frame, text="Alpha (m):").grid(row=0, column=2, padx=5, sticky="w")
+        ttk.Entry(hull_frame, textvariable=self.hull_alpha_var, width=6).grid(row=0, column=3, padx=5, sticky="w")
+        ttk.Label(hull_frame, text="Simplification (m):").grid(row=1, column=0, padx=5, sticky="w")
+        ttk.Entry(hull_frame, textvariable=self.hull_tolerance_var, width=6).grid(row=1, column=1, padx=5, sticky="w")
+        
         # Bouton de réinitialisation
         ttk.Button(main_params_frame, text="Réinitialiser les paramètres", 
                   command=self.reset_to_defaults).grid(row=2, column=0, pady=10)
@@ -325,12 +456,17 @@ class DataMiningInterface:
         
     def on_algo_change(self, event):
         """Affiche/cache les paramètres et boutons selon l'algorithme choisi"""
-        if self.algo_var.get() == "DBSCAN":
-            self.dbscan_frame.grid()
-            self.kmeans_frame.grid_remove()
-        else:
-            self.dbscan_frame.grid_remove()
-            self.kmeans_frame.grid()
+        frames = {
+            "K-means": self.kmeans_frame,
+            "K-means (mini-lots)": self.kmeans_frame,
+            "HDBSCAN (hiérarchique)": self.hdbscan_frame,
+        }
+        selected = frames.get(self.algo_var.get(), self.dbscan_frame)
+        for frame in (self.dbscan_frame, self.hdbscan_frame, self.kmeans_frame):
+            if frame is selected:
+                frame.grid()
+            else:
+                frame.grid_remove()
         
         # Mettre à jour les boutons d'action
         self.update_action_buttons()
@@ -364,19 +500,32 @@ class DataMiningInterface:
         """Réinitialise tous les paramètres à leurs valeurs par défaut"""
         self.eps_var.set(self.default_values['eps'])
         self.min_samples_var.set(self.default_values['min_samples'])
+        self.max_eps_var.set(self.default_values['max_eps'])
+        self.min_cluster_size_var.set(self.default_values['min_cluster_size'])
+        self.cut_scale.set(int(self.default_values['cut']))
         self.n_clusters_var.set(self.default_values['n_clusters'])
+        self.silhouette_sample_var.set(self.default_values['silhouette_sample'])
         self.n_points_var.set(self.default_values['n_points'])
         self.n_common_tags_var.set(self.default_values['n_common_tags'])
         self.data_file_path.set(self.default_values['data_file'])
         self.algo_var.set(self.default_values['algo'])
         self.display_points_var.set(self.default_values['display_points'])
+        self.cluster_all_var.set(False)
         self.show_time_plots_var.set(True)
         self.time_grouping_var.set("mois")
+        self.point_display_var.set("points")
+        self.grid_size_var.set(self.default_values['grid_size'])
+        self.hull_mode_var.set("convexe")
+        self.hull_tolerance_var.set(self.default_values['hull_tolerance'])
+        self.hull_alpha_var.set(self.default_values['hull_alpha'])
+        self.region_var.set(self.default_values['region'])
+        self.use_region_var.set(False)
         messagebox.showinfo("Réinitialisation", "Les paramètres ont été réinitialisés aux valeurs par défaut.")
         
     def select_file(self):
         filetypes = (
             ('Fichiers CSV', '*.csv'),
+            ('Fichiers Parquet', '*.parquet'),
             ('Tous les fichiers', '*.*')
         )
         
@@ -388,26 +537,64 @@ class DataMiningInterface:
         
         if filename:
             self.data_file_path.set(filename)
+            self.refresh_suggestions()
+
+    def update_dataset_scope(self, path, region=None, start_date=None, end_date=None):
+        """Dossier partitionné : ne charger que les partitions de la zone et de la période"""
+        if is_partitioned(path):
+            self.dataset.set_scope(
+                bounds=None if region is None else (region.min(axis=0), region.max(axis=0)),
+                years=None if start_date is None else (start_date.year, end_date.year))
+
+    def claim_algo(self, name, job):
+        """Réserve l'instance partagée self.<name> à job.
+
+        Si une génération annulée l'utilise encore, elle garde l'ancienne instance et
+        self.<name> est remplacé par une instance neuve (les caches sont perdus).
+        """
+        with self.algo_lock:
+            owner = self.algo_owners.get(name)
+            if owner is not None and owner is not job and not owner.done.is_set():
+                setattr(self, name, type(getattr(self, name))())
+            self.algo_owners[name] = job
+            return getattr(self, name)
+
+    def select_directory(self):
+        """Choisit un dossier partitionné écrit par cleaning_data.py --partitioned"""
+        directory = filedialog.askdirectory(title='Choisir un dossier de données partitionné', initialdir='.')
+        
+        if directory:
+            if not is_partitioned(directory):
+                messagebox.showerror("Erreur", "Ce dossier ne contient pas de données partitionnées "
+                                               f"({MANIFEST_FILE} manquant)")
+                return
+            # Les filtres actifs limitent dès maintenant les partitions chargées
+            try:
+                region = parse_region(self.region_var.get()) if self.use_region_var.get() else None
+                dates = [None, None]
+                if self.use_date_filter.get():
+                    dates = [datetime.strptime(self.date_start_var.get(), "%d/%m/%Y").date(),
+                             datetime.strptime(self.date_end_var.get(), "%d/%m/%Y").date()]
+                self.update_dataset_scope(directory, region, *dates)
+            except ValueError as e:
+                print(f"Filtres ignorés pour le chargement du dossier: {e}")
+            self.data_file_path.set(directory)
+            self.refresh_suggestions()
         
 
     
     def plot_cluster_frequentation(self, cluster_id):
         """Affiche un graphique de la fréquentation pour un cluster donné"""
-        if self.cluster_data is None or cluster_id not in self.cluster_data:
+        if self.time_cube is None or cluster_id not in self.time_cube:
             messagebox.showerror("Erreur", "Données du cluster non disponibles")
             return
         
-        # Récupérer les données du cluster
-        cluster_df = self.cluster_data[cluster_id]
-        
-        # Convertir les dates en datetime si nécessaire
-        cluster_df['date_taken'] = pd.to_datetime(cluster_df['date_taken'])
-        
         # Créer le graphique
         plt.figure(figsize=(12, 6))
         
-        # Compter le nombre de photos par jour
-        daily_counts = cluster_df.groupby(cluster_df['date_taken'].dt.date).size()
+        # Nombre de photos par jour, lu dans les comptes déjà agrégés
+        days, counts = self.time_cube.counts(cluster_id, "jour")
+        daily_counts = pd.Series(counts, index=days.astype('datetime64[ns]'))
         
         # Tracer le graphique
         sns.lineplot(data=daily_counts)
@@ -425,171 +612,277 @@ class DataMiningInterface:
     
     def generate_map(self):
         try:
-            # Créer et afficher la fenêtre de chargement
+            # Vérification du fichier de données
+            if not Path(self.data_file_path.get()).exists():
+                error_msg = "Le fichier de données n'existe pas!"
+                print(f"Erreur: {error_msg}")
+                messagebox.showerror("Erreur", error_msg)
+                return
+            
+            # Lire les paramètres dans le thread de Tk : le traitement tourne en arrière-plan
+            params = {
+                'data_file': self.data_file_path.get(),
+                'use_date_filter': self.use_date_filter.get(),
+                'date_start': self.date_start_var.get(),
+                'date_end': self.date_end_var.get(),
+                'use_region': self.use_region_var.get(),
+                'region': self.region_var.get(),
+                'search_term': self.search_var.get().lower().strip(),
+                'keep_search_tag': self.keep_search_tag_var.get(),
+                'algo': self.algo_var.get(),
+                'eps': self.eps_var.get(),
+                'min_samples': self.min_samples_var.get(),
+                'max_eps': self.max_eps_var.get(),
+                'min_cluster_size': self.min_cluster_size_var.get(),
+                'cut': self.cut_var.get(),
+                'n_clusters': self.n_clusters_var.get(),
+                'display_points': self.display_points_var.get(),
+                'cluster_all': self.cluster_all_var.get(),
+                'n_points': self.n_points_var.get(),
+                'n_common_tags': self.n_common_tags_var.get(),
+                'show_points': self.show_points_var.get(),
+                'point_display': self.point_display_var.get(),
+                'grid_size': self.grid_size_var.get(),
+                'hull_mode': self.hull_mode_var.get(),
+                'hull_tolerance': self.hull_tolerance_var.get(),
+                'hull_alpha': self.hull_alpha_var.get(),
+                'show_time_plots': self.show_time_plots_var.get(),
+                'time_grouping': self.time_grouping_var.get(),
+            }
+            
+            # Une génération déjà en cours est annulée et sa fenêtre remplacée
+            self.close_loading_window()
+            
+            # Créer et afficher la fenêtre de progression (non modale : les paramètres
+            # restent modifiables et une nouvelle génération remplace celle en cours)
             loading_window = tk.Toplevel(self.root)
             loading_window.title("Génération en cours...")
-            loading_window.geometry("300x150")
-            
-            # Centrer la fenêtre de chargement
+            loading_window.geometry("360x190")
             loading_window.transient(self.root)
-            loading_window.grab_set()
             loading_window.geometry("+%d+%d" % (
-                self.root.winfo_rootx() + self.root.winfo_width()//2 - 150,
-                self.root.winfo_rooty() + self.root.winfo_height()//2 - 75))
+                self.root.winfo_rootx() + self.root.winfo_width()//2 - 180,
+                self.root.winfo_rooty() + self.root.winfo_height()//2 - 95))
             
-            # Ajouter un message et une barre de progression
+            # Ajouter un message, l'étape en cours et une barre de progression
             ttk.Label(loading_window, text="Génération de la carte en cours...", 
-                     padding=20).pack()
+                     padding=(20, 15, 20, 5)).pack()
+            stage_label = ttk.Label(loading_window, text="Préparation...", font=('Helvetica', 10, 'bold'))
+            stage_label.pack()
+            detail_label = ttk.Label(loading_window, text="", font=('Helvetica', 9))
+            detail_label.pack()
             progress = ttk.Progressbar(loading_window, mode='indeterminate')
             progress.pack(padx=20, pady=10, fill='x')
             progress.start(10)
+            ttk.Button(loading_window, text="Annuler", command=self.cancel_generation).pack()
+            loading_window.protocol("WM_DELETE_WINDOW", self.cancel_generation)
+            self.loading_window = loading_window
             
-            # Mettre à jour l'interface
-            loading_window.update()
+            def on_progress(stage, detail):
+                stage_label.config(text=stage)
+                detail_label.config(text=detail)
             
-            try:
-                # Vérification et chargement des données
-                if not Path(self.data_file_path.get()).exists():
-                    loading_window.destroy()
-                    error_msg = "Le fichier de données n'existe pas!"
-                    print(f"Erreur: {error_msg}")
-                    messagebox.showerror("Erreur", error_msg)
+            def on_done(result):
+                self.close_loading_window()
+                if 'info' in result:
+                    messagebox.showinfo("Résultat", result['info'])
                     return
-                
-                # Chargement de toutes les données
-                df = pd.read_csv(self.data_file_path.get(), low_memory=False)
-                
-                # Appliquer le filtre temporel si activé
-                if self.use_date_filter.get():
-                    try:
-                        # Convertir les dates sélectionnées au format YYYY-MM-DD
-                        start_date = datetime.strptime(self.date_start_var.get(), "%d/%m/%Y").strftime("%Y-%m-%d")
-                        end_date = datetime.strptime(self.date_end_var.get(), "%d/%m/%Y").strftime("%Y-%m-%d")
-                        
-                        # Convertir la colonne date_taken en datetime si ce n'est pas déjà fait
-                        df['date_taken'] = pd.to_datetime(df['date_taken'])
-                        
-                        # Filtrer les données selon la période
-                        mask = (df['date_taken'].dt.date >= pd.to_datetime(start_date).date()) & \
-                              (df['date_taken'].dt.date <= pd.to_datetime(end_date).date())
-                        df = df[mask]
-                        
-                        if len(df) == 0:
-                            messagebox.showinfo("Résultat", "Aucun point trouvé dans cette période")
-                            return
-                    except Exception as e:
-                        messagebox.showerror("Erreur", 
-                            f"Erreur lors du filtrage par date: {str(e)}\n"
-                            "Vérifiez le format des dates.")
-                        return
-                
-                # Appliquer le filtre de tag si un tag est spécifié
-                search_term = self.search_var.get().lower().strip()
-                if search_term:
-                    mask = df['tags'].fillna('').str.lower().str.contains(search_term)
-                    df = df[mask]
-                    if len(df) == 0:
-                        messagebox.showinfo("Résultat", "Aucun point trouvé avec ce tag")
-                        return
-                    
-                    # Ajouter les attributs pour le traitement des tags
-                    df.search_term = search_term
-                    df.keep_search_tag = self.keep_search_tag_var.get()
-                
-                # Faire le clustering sur tous les points
-                if self.algo_var.get() == "DBSCAN":
-                    clustering_algo = DBSCAN(
-                        eps=float(self.eps_var.get()),
-                        min_samples=int(self.min_samples_var.get())
-                    )
-                else:
-                    clustering_algo = KMeans(
-                        n_clusters=min(int(self.n_clusters_var.get()), len(df)),
-                        random_state=42
-                    )
-                
-                # Appliquer le clustering sur tous les points
-                df['cluster'] = clustering_algo.fit_predict(df[['lat', 'long']].values)
-                
-                # Sélectionner un échantillon aléatoire pour l'affichage si nécessaire
-                max_display_points = int(self.display_points_var.get())
-                if len(df) > max_display_points:
-                    # Échantillonnage stratifié par cluster pour maintenir la distribution
-                    display_df = pd.DataFrame()
-                    for cluster in df['cluster'].unique():
-                        cluster_data = df[df['cluster'] == cluster]
-                        # Calculer le nombre de points à prendre de ce cluster
-                        n_points = int(max_display_points * (len(cluster_data) / len(df)))
-                        if n_points > 0:  # S'assurer qu'on prend au moins 1 point
-                            sampled = cluster_data.sample(n=min(n_points, len(cluster_data)), 
-                                                        random_state=42)
-                            display_df = pd.concat([display_df, sampled])
-                    
-                    # S'assurer qu'on a exactement max_display_points
-                    if len(display_df) < max_display_points:
-                        remaining = max_display_points - len(display_df)
-                        additional = df[~df.index.isin(display_df.index)].sample(n=remaining, 
-                                                                               random_state=42)
-                        display_df = pd.concat([display_df, additional])
-                else:
-                    display_df = df
-                
-                # Stocker les données par cluster
-                self.cluster_data = {}
-                for cluster_id in df['cluster'].unique():
-                    self.cluster_data[cluster_id] = df[df['cluster'] == cluster_id].copy()
-                
-                # Continuer avec la génération de la carte
-                map_visualization.df = df
-                map_visualization.nb_points_cluster = self.n_points_var.get()
-                map_visualization.clustering_algo = clustering_algo
-                map_visualization.N = int(self.n_common_tags_var.get())
-                map_visualization.show_points = self.show_points_var.get()
-                map_visualization.show_time_plots = self.show_time_plots_var.get()
-                map_visualization.time_grouping = self.time_grouping_var.get()
-                
-                try:
-                    map_visualization.main()
-                except Exception as e:
-                    loading_window.destroy()
-                    error_msg = f"Erreur lors de la génération de la carte: {str(e)}"
-                    print(f"Erreur: {error_msg}")
-                    raise
-                
-                # Mise à jour du message de succès
-                total_points = self.n_points_var.get()
-                message = f"La carte a été générée avec {total_points} points maximum"
-
-                if self.show_points_var.get():
-                    displayed_points = len(display_df)
-                    message += f" dont {displayed_points} points affichés"
-                else:
-                    message += " (aucun point affiché sur la carte)"
-
-                if search_term:
-                    message += f" contenant le tag '{search_term}'"
-                if self.use_date_filter.get():
-                    message += f"\nPériode : du {self.date_start_var.get()} au {self.date_end_var.get()}"
-                
-                # Fermer la fenêtre de chargement
-                loading_window.destroy()
-                
-                print(f"Succès: {message}")
-                messagebox.showinfo("Succès", message + "!")
-                
-            except Exception as e:
-                # S'assurer que la fenêtre de chargement est fermée en cas d'erreur
-                loading_window.destroy()
+                self.time_cube = result['time_cube']
+                print(f"Succès: {result['message']}")
+                messagebox.showinfo("Succès", result['message'] + "!")
+            
+            def on_error(e):
+                self.close_loading_window()
                 error_msg = f"Une erreur est survenue: {str(e)}"
                 print(f"Erreur: {error_msg}")
                 messagebox.showerror("Erreur", error_msg)
             
+            self.jobs.submit(lambda job: self.run_map_job(job, params), on_progress, on_done, on_error)
+            
         except Exception as e:
             # En cas d'erreur lors de la création de la fenêtre de chargement
             error_msg = f"Une erreur est survenue: {str(e)}"
             print(f"Erreur: {error_msg}")
             messagebox.showerror("Erreur", error_msg)
 
+    def cancel_generation(self):
+        """Annule la génération en cours et ferme sa fenêtre de progression"""
+        if self.jobs.is_running():
+            print("Génération annulée")
+        self.jobs.cancel()
+        self.close_loading_window()
+
+    def close_loading_window(self):
+        if self.loading_window is not None:
+            self.loading_window.destroy()
+            self.loading_window = None
+
+    def run_map_job(self, job, params):
+        """Pipeline de génération de la carte, exécuté hors du thread de Tk.
+
+        N'accède pas aux widgets : les étapes sont signalées par job.report et le résultat
+        (message ou information) est renvoyé au thread de Tk.
+        """
+        # Période et zone demandées (lues avant le chargement : elles limitent les partitions lues)
+        start_date = end_date = None
+        if params['use_date_filter']:
+            try:
+                start_date = datetime.strptime(params['date_start'], "%d/%m/%Y").date()
+                end_date = datetime.strptime(params['date_end'], "%d/%m/%Y").date()
+            except Exception as e:
+                raise ValueError(f"Erreur lors du filtrage par date: {str(e)}\n"
+                                 "Vérifiez le format des dates.")
+        region = parse_region(params['region']) if params['use_region'] else None
+        
+        # Données en mémoire (date_taken est déjà de type datetime)
+        job.report("Chargement des données")
+        self.update_dataset_scope(params['data_file'], region, start_date, end_date)
+        df = self.dataset.view(params['data_file'])
+        job.report("Filtrage", f"{len(df)} lignes chargées")
+        
+        # Filtres temporel, par tag et par zone : chacun donne une liste triée de lignes,
+        # intersectées avant de copier les données
+        date_rows = None
+        if start_date is not None:
+            # Période : deux recherches dans l'index temporel
+            date_rows = self.time_index(params['data_file']).search(start_date, end_date)
+            if len(date_rows) == 0:
+                return {'info': "Aucun point trouvé dans cette période"}
+        
+        search_term = params['search_term']
+        tag_rows = None
+        if search_term:
+            tag_rows = self.tag_index(params['data_file']).search(search_term)
+        
+        # Zone : seules les cellules de l'index spatial qui touchent la zone sont lues
+        region_rows = None
+        if region is not None:
+            region_rows = self.spatial_index(params['data_file']).query(region)
+            if len(region_rows) == 0:
+                return {'info': "Aucun point trouvé dans cette zone"}
+        
+        rows = intersect_rows(date_rows, tag_rows, region_rows)
+        if rows is not None:
+            df = df.take(rows)
+        if params['use_region'] and len(df) == 0:
+            return {'info': "Aucun point trouvé dans cette zone pour ces filtres"}
+        
+        if search_term and len(df) == 0:
+            return {'info': "Aucun point trouvé avec ce tag"}
+        
+        # Faire le clustering sur tous les points
+        job.report("Clustering", f"{len(df)} points")
+        if params['algo'] == "DBSCAN":
+            clustering_algo = self.claim_algo('geo_dbscan', job)
+            clustering_algo.eps = float(params['eps'])
+            clustering_algo.min_samples = int(params['min_samples'])
+            clustering_algo.max_eps = float(params['max_eps'])
+        elif params['algo'] == "HDBSCAN (hiérarchique)":
+            clustering_algo = self.claim_algo('hdbscan', job)
+            clustering_algo.min_cluster_size = int(params['min_cluster_size'])
+            clustering_algo.min_samples = int(params['min_samples'])
+            cut = float(params['cut'])
+            clustering_algo.cut = cut if cut > 0 else None
+        elif params['algo'] == "DBSCAN approché (grille)":
+            clustering_algo = GridDBSCAN(
+                eps=float(params['eps']),
+                min_samples=int(params['min_samples'])
+            )
+        elif params['algo'] == "K-means (mini-lots)":
+            # Centroïdes appris par lots puis affectation de tous les points
+            # Les centroïdes sauvegardés ne sont repris que pour le même fichier et les mêmes filtres
+            clustering_algo = StreamingKMeans(
+                n_clusters=min(int(params['n_clusters']), len(df)),
+                source=(file_signature(params['data_file']),
+                        (start_date, end_date), search_term, params['region'] if region is not None else None)
+            )
+        else:
+            clustering_algo = KMeans(
+                n_clusters=min(int(params['n_clusters']), len(df)),
+                random_state=42
+            )
+        
+        # Appliquer le clustering sur tous les points
+        df['cluster'] = clustering_algo.fit_predict(df[['lat', 'long']].values)
+        n_found = len(np.unique(df['cluster'].to_numpy()[df['cluster'].to_numpy() >= 0]))
+        job.report("Clustering", f"{n_found} clusters trouvés")
+        
+        # Mesurer l'écart du DBSCAN approché avec DBSCAN exact sur un échantillon
+        approx_report = None
+        if isinstance(clustering_algo, GridDBSCAN):
+            approx_report = clustering_algo.compare_with_exact(df[['lat', 'long']].values)
+            print(f"DBSCAN approché vs exact: {approx_report}")
+        
+        # Continuer avec la génération de la carte
+        job.report("Génération de la carte")
+        tokens = self.dataset.derived(params['data_file'], 'tokens', TokenizedDataset)
+        with self.render_lock:
+            # Une génération annulée pendant le clustering ne touche ni à la carte ni à ses fichiers
+            job.check()
+            displayed_points, time_cube = self.render_map(job, params, df, tokens, clustering_algo, region)
+        
+        # Mise à jour du message de succès
+        total_points = len(df) if params['cluster_all'] else params['n_points']
+        message = f"La carte a été générée avec {total_points} points maximum"
+
+        if params['show_points']:
+            message += f" dont {displayed_points} points affichés"
+        else:
+            message += " (aucun point affiché sur la carte)"
+
+        if search_term:
+            message += f" contenant le tag '{search_term}'"
+        if params['use_date_filter']:
+            message += f"\nPériode : du {params['date_start']} au {params['date_end']}"
+        if params['use_region']:
+            message += f"\nZone : {params['region']}"
+        if approx_report:
+            message += (f"\nÉcart avec DBSCAN exact sur {approx_report['sample_size']} points : "
+                        f"indice de Rand ajusté {approx_report['ari']:.3f}, "
+                        f"{approx_report['noise_mismatch']:.1%} de points bruit/cluster différents")
+        
+        # Comptes par (cluster, jour) calculés par la carte : les mêmes clusters que ses graphiques
+        return {'message': message, 'time_cube': time_cube}
+
+    def render_map(self, job, params, df, tokens, clustering_algo, region):
+        """Configure map_visualization et écrit la carte (appelé avec self.render_lock).
+
+        Renvoie le nombre de points affichés et les comptes par (cluster, jour) de la carte.
+        """
+        map_visualization.df = df
+        map_visualization.tokens = tokens
+        if params['cluster_all']:
+            map_visualization.nb_points_cluster = len(df)
+        else:
+            map_visualization.nb_points_cluster = params['n_points']
+        map_visualization.clustering_algo = clustering_algo
+        map_visualization.N = int(params['n_common_tags'])
+        map_visualization.show_points = params['show_points']
+        map_visualization.display_points = int(params['display_points'])
+        map_visualization.point_display = params['point_display']
+        map_visualization.grid_cell_size = float(params['grid_size'])
+        map_visualization.hull_mode = params['hull_mode']
+        map_visualization.hull_tolerance = float(params['hull_tolerance'])
+        map_visualization.hull_alpha = float(params['hull_alpha'])
+        map_visualization.region = region
+        map_visualization.show_time_plots = params['show_time_plots']
+        map_visualization.time_grouping = params['time_grouping']
+        map_visualization.search_terms = query_terms(params['search_term'])
+        map_visualization.keep_search_tag = params['keep_search_tag']
+        map_visualization.progress = job
+        map_visualization.time_cube = None
+        
+        try:
+            map_visualization.main()
+        except JobCancelled:
+            raise
+        except Exception as e:
+            error_msg = f"Erreur lors de la génération de la carte: {str(e)}"
+            print(f"Erreur: {error_msg}")
+            raise
+        finally:
+            map_visualization.progress = None
+        return map_visualization.n_displayed_points, map_visualization.time_cube
+
     def elbow_method(self):
         try:
             # Charger et préparer les données
@@ -612,17 +905,22 @@ class DataMiningInterface:
                     "Un grand nombre de clusters peut prendre beaucoup de temps à calculer. Continuer?"):
                     return
             
+            data = self.loaded()
+            if data is None:
+                messagebox.showinfo("Chargement", "Les données sont en cours de chargement, réessayez dans un instant")
+                return
+            
             # Créer une fenêtre de chargement plus grande
             progress_window = tk.Toplevel(self.root)
             progress_window.title("Calcul de la méthode du coude")
-            progress_window.geometry("400x200")  # Fenêtre plus grande
+            progress_window.geometry("700x520")
             
             # Centrer la fenêtre
             progress_window.transient(self.root)
             progress_window.grab_set()
             progress_window.geometry("+%d+%d" % (
-                self.root.winfo_rootx() + self.root.winfo_width()//2 - 200,
-                self.root.winfo_rooty() + self.root.winfo_height()//2 - 100))
+                self.root.winfo_rootx() + self.root.winfo_width()//2 - 350,
+                self.root.winfo_rooty() + self.root.winfo_height()//2 - 260))
             
             # Frame pour organiser les éléments
             info_frame = ttk.Frame(progress_window, padding="20")
@@ -649,71 +947,105 @@ class DataMiningInterface:
             cluster_label = ttk.Label(info_frame, text="", font=('Helvetica', 10))
             cluster_label.pack()
             
-            progress_window.update()
+            # Courbes partielles, complétées à chaque k terminé
+            live_fig, (live_ax1, live_ax2) = plt.subplots(1, 2, figsize=(7, 2.8))
+            live_canvas = FigureCanvasTkAgg(live_fig, master=info_frame)
+            live_canvas.get_tk_widget().pack(fill='both', expand=True, pady=(10, 0))
             
-            # Charger les données et faire les calculs
-            df = pd.read_csv(self.data_file_path.get(), low_memory=False)
-            df = df.head(int(self.n_points_var.get()))
+            # Lancer le balayage en arrière-plan sur les données déjà chargées
+            df = data[['lat', 'long']].head(int(self.n_points_var.get()))
             X = df[['lat', 'long']].values
             
-            # Calculer l'inertie et le score silhouette
             k_range = range(k_min, k_max + 1)
-            inertias = []
-            silhouette_scores = []
+            sweep = KMeansSweep(X, k_range, silhouette_sample=int(self.silhouette_sample_var.get())).start()
             
-            for i, k in enumerate(k_range):
-                progress_var.set(i)
-                progress_label.config(text=f"Calcul des clusters...")
-                cluster_label.config(text=f"Nombre de clusters: {k}")
-                progress_window.update()
-                
-                kmeans = KMeans(n_clusters=k, random_state=42)
-                kmeans.fit(X)
-                inertias.append(kmeans.inertia_)
-                score = silhouette_score(X, kmeans.labels_)
-                silhouette_scores.append(score)
-            
-            progress_window.destroy()
-            
-            # Créer une figure avec deux sous-graphiques
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-            
-            # Graphique de l'inertie (méthode du coude)
-            ax1.plot(k_range, inertias, 'bx-')
-            ax1.set_xlabel('k (nombre de clusters)')
-            ax1.set_ylabel('Inertie')
-            ax1.set_title('Méthode du coude')
-            
-            # Graphique du score silhouette
-            ax2.plot(k_range, silhouette_scores, 'rx-')
-            ax2.set_xlabel('k (nombre de clusters)')
-            ax2.set_ylabel('Score Silhouette')
-            ax2.set_title('Score Silhouette vs. k')
+            def cancel():
+                sweep.cancel()
+                plt.close(live_fig)
+                progress_window.destroy()
+                print("Méthode du coude annulée")
             
-            plt.tight_layout()
-            plt.show()
+            ttk.Button(info_frame, text="Annuler", command=cancel).pack(pady=(10, 0))
+            progress_window.protocol("WM_DELETE_WINDOW", cancel)
             
-            # Trouver le meilleur k selon le score silhouette
-            best_k = k_range[np.argmax(silhouette_scores)]
-            messagebox.showinfo("Résultat", 
-                f"Selon le score silhouette, le nombre optimal de clusters est {best_k}.\n"
-                f"Vous pouvez aussi utiliser le graphique de la méthode du coude pour "
-                f"choisir le nombre de clusters.")
+            def poll():
+                # Balayage annulé entre-temps
+                if not progress_window.winfo_exists():
+                    return
+                try:
+                    new_results = sweep.poll()
+                except Exception as e:
+                    plt.close(live_fig)
+                    progress_window.destroy()
+                    messagebox.showerror("Erreur", f"Une erreur est survenue: {str(e)}")
+                    return
+                
+                if new_results:
+                    ks, inertias, silhouette_scores = sweep.curves()
+                    progress_var.set(len(ks))
+                    progress_label.config(text=f"{len(ks)} / {len(k_range)} valeurs de k calculées")
+                    cluster_label.config(text=f"Dernier k terminé : {new_results[-1]['k']}")
+                    live_ax1.clear()
+                    live_ax1.plot(ks, inertias, 'bx-')
+                    live_ax1.set_title('Inertie')
+                    live_ax2.clear()
+                    live_ax2.plot(ks, silhouette_scores, 'rx-')
+                    live_ax2.set_title('Score Silhouette')
+                    live_canvas.draw_idle()
+                
+                if sweep.done():
+                    sweep.close()
+                    plt.close(live_fig)
+                    progress_window.destroy()
+                    self.show_elbow_results(sweep)
+                else:
+                    self.root.after(100, poll)
             
-            # Mettre à jour automatiquement le nombre de clusters
-            self.n_clusters_var.set(str(best_k))
+            self.root.after(100, poll)
             
         except ValueError as ve:
             messagebox.showerror("Erreur", "Veuillez entrer des nombres valides pour k_min et k_max")
         except Exception as e:
             messagebox.showerror("Erreur", f"Une erreur est survenue: {str(e)}")
 
+    def show_elbow_results(self, sweep):
+        """Affiche les courbes finales de la méthode du coude et propose le meilleur k"""
+        k_range, inertias, silhouette_scores = sweep.curves()
+        
+        # Créer une figure avec deux sous-graphiques
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+        
+        # Graphique de l'inertie (méthode du coude)
+        ax1.plot(k_range, inertias, 'bx-')
+        ax1.set_xlabel('k (nombre de clusters)')
+        ax1.set_ylabel('Inertie')
+        ax1.set_title('Méthode du coude')
+        
+        # Graphique du score silhouette
+        ax2.plot(k_range, silhouette_scores, 'rx-')
+        ax2.set_xlabel('k (nombre de clusters)')
+        ax2.set_ylabel(f'Score Silhouette (échantillon de {sweep.silhouette_sample} points)')
+        ax2.set_title('Score Silhouette vs. k')
+        
+        plt.tight_layout()
+        plt.show()
+        
+        # Trouver le meilleur k selon le score silhouette
+        best_k = k_range[np.argmax(silhouette_scores)]
+        messagebox.showinfo("Résultat", 
+            f"Selon le score silhouette, le nombre optimal de clusters est {best_k}.\n"
+            f"Vous pouvez aussi utiliser le graphique de la méthode du coude pour "
+            f"choisir le nombre de clusters.")
+        
+        # Mettre à jour automatiquement le nombre de clusters
+        self.n_clusters_var.set(str(best_k))
+
     def update_action_buttons(self):
         """Met à jour l'affichage des boutons selon l'algorithme sélectionné"""
-        if self.algo_var.get() == "DBSCAN":
-            self.elbow_button.grid_remove()
-        else:
+        if self.algo_var.get().startswith("K-means"):
             self.elbow_button.grid()
+        else:
+            self.elbow_button.grid_remove()
 
     def filter_by_tag(self):
         """Vérifie simplement si le tag existe dans les données"""
@@ -728,11 +1060,14 @@ class DataMiningInterface:
                 messagebox.showerror("Erreur", "Le fichier de données n'existe pas!")
                 return
                 
-            # Vérification rapide de l'existence du tag
-            df = pd.read_csv(self.data_file_path.get(), low_memory=False)
-            df = df.head(int(self.n_points_var.get()))
-            mask = df['tags'].fillna('').str.lower().str.contains(search_term)
-            count = mask.sum()
+            index = self.loaded('tag_index')
+            if index is None:
+                messagebox.showinfo("Chargement", "Les données sont en cours de chargement, réessayez dans un instant")
+                return
+            
+            # Vérification rapide de l'existence du tag parmi les n_points premières lignes
+            rows = index.search(search_term)
+            count = int((rows < int(self.n_points_var.get())).sum())
             
             if count == 0:
                 messagebox.showinfo("Résultat", "Aucun point ne contient ce tag")
@@ -744,21 +1079,111 @@ class DataMiningInterface:
         except Exception as e:
             messagebox.showerror("Erreur", f"Une erreur est survenue: {str(e)}")
 
+    def tag_index(self, path=None):
+        """Index inversé des tags du fichier sélectionné (construit une fois par fichier)"""
+        return self.dataset.derived(path or self.data_file_path.get(), 'tag_index',
+                                    lambda df: TagIndex(df['tags']))
+
+    def time_index(self, path=None):
+        """Index temporel du fichier sélectionné (construit une fois par fichier)"""
+        return self.dataset.derived(path or self.data_file_path.get(), 'time_index',
+                                    lambda df: TimeIndex(df['date_taken']))
+
+    def spatial_index(self, path=None):
+        """Index spatial des coordonnées du fichier sélectionné (construit une fois par fichier)"""
+        return self.dataset.derived(path or self.data_file_path.get(), 'spatial_index',
+                                    lambda df: SpatialIndex(df['lat'], df['long']))
+
+    def loaded(self, name=None):
+        """Données (ou donnée dérivée name) du fichier sélectionné si elles sont déjà en mémoire.
+
+        Sinon lance leur chargement en arrière-plan et renvoie None : à utiliser dans le thread de Tk.
+        """
+        path = self.data_file_path.get()
+        value = self.dataset.peek(path, name)
+        if value is None:
+            self.preload_dataset(path)
+        return value
+
+    def preload_dataset(self, path):
+        """Charge le fichier et son index des tags en arrière-plan, puis met à jour les suggestions"""
+        if self.preloading == path and self.preload.is_running():
+            return
+        self.preloading = path
+        self.preload.submit(lambda job: self.tag_index(path),
+                            lambda stage, detail: None,
+                            lambda index: self.refresh_suggestions(),
+                            lambda e: print(f"Erreur lors du chargement de {path}: {e}"))
+
+    def current_search_prefix(self):
+        """Dernier terme de la requête en cours de saisie (après le dernier & ou |)"""
+        query = self.search_var.get()
+        last = query.replace('|', '&').split('&')[-1]
+        return last.strip().strip('"*')
+
+    def refresh_suggestions(self):
+        """Affiche les tags les plus fréquents qui complètent la saisie en cours"""
+        for widget in self.suggestions_frame.winfo_children():
+            widget.destroy()
+        
+        ttk.Label(self.suggestions_frame, text="Suggestions:").grid(row=0, column=0, padx=2)
+        
+        try:
+            if not Path(self.data_file_path.get()).exists():
+                return
+            index = self.loaded('tag_index')
+            if index is None:
+                # Les suggestions seront affichées à la fin du chargement
+                return
+            suggestions = index.complete(self.current_search_prefix(), limit=4)
+        except Exception as e:
+            print(f"Erreur lors du calcul des suggestions: {e}")
+            return
+        
+        for i, (tag, count) in enumerate(suggestions):
+            ttk.Button(self.suggestions_frame, text=tag, 
+                      command=lambda t=tag: self.apply_suggestion(t)).grid(row=0, column=i+1, padx=2)
+
     def apply_suggestion(self, tag):
         """Applique le tag suggéré à la barre de recherche et lance la recherche"""
-        self.search_var.set(tag)
+        query = self.search_var.get()
+        # Remplacer le terme en cours de saisie par le tag suggéré
+        cut = max(query.rfind('&'), query.rfind('|'))
+        if cut >= 0:
+            self.search_var.set(f"{query[:cut + 1]} {tag}")
+        else:
+            self.search_var.set(tag)
         self.filter_by_tag()
 
     def update_eps(self, value):
-        """Met à jour la valeur d'epsilon"""
+        """Met à jour la valeur d'epsilon (en mètres)"""
         val = float(float(value))
-        self.eps_var.set(f"{val:.6f}")
+        self.eps_var.set(f"{val:.1f}")
 
     def update_min_samples(self, value):
         """Met à jour la valeur de min_samples"""
         val = int(float(value))
         self.min_samples_var.set(str(val))
 
+    def update_cut(self, value):
+        """Met à jour la coupe de la hiérarchie et affiche le nombre de clusters obtenus"""
+        val = int(float(value))
+        self.cut_var.set(str(val))
+        text = "auto" if val == 0 else f"{val} m"
+        
+        # Si la hiérarchie des données et paramètres actuels est déjà calculée, la coupe est immédiate
+        # (pendant le calcul d'une nouvelle hiérarchie, l'ancienne n'est pas utilisée)
+        try:
+            min_samples = int(self.min_samples_var.get())
+            min_cluster_size = int(self.min_cluster_size_var.get())
+        except ValueError:
+            min_samples = min_cluster_size = None
+        model = self.hdbscan.current_model(min_samples, min_cluster_size) if min_samples is not None else None
+        if model is not None:
+            labels = self.hdbscan.labels_at(val if val > 0 else None, model)
+            text += f" ({labels.max() + 1} clusters)"
+        self.cut_label.config(text=text)
+
     def update_n_clusters(self, value):
         """Met à jour le nombre de clusters"""
         val = int(float(value))
@@ -0,0 +1,108 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class JobCancelled(Exception):
+    """Levée dans le traitement quand la tâche a été annulée"""
+
+    def __init__(self):
+        super().__init__("Génération annulée")
+
+
+class Job:
+    """Une exécution du traitement : file des messages de progression et drapeau d'annulation"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.cancelled = threading.Event()
+        # Levé quand le traitement est terminé (même annulé) : ses ressources sont libres
+        self.done = threading.Event()
+        self.messages = queue.Queue()
+
+    def report(self, stage, detail=""):
+        """Signale l'étape en cours ; c'est aussi un point d'arrêt si la tâche est annulée"""
+        self.check()
+        self.messages.put((stage, detail))
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class JobRunner:
+    """Exécute les traitements longs hors du thread de Tk.
+
+    Chaque tâche a son propre thread. Lancer une nouvelle tâche annule la précédente sans
+    l'attendre : l'ancienne s'arrête à son prochain point d'arrêt (un clustering en cours va
+    jusqu'au bout) et ses résultats sont ignorés. Deux tâches peuvent donc se chevaucher ;
+    les ressources partagées ont leurs propres verrous. Les messages de progression sont
+    relevés par root.after, les callbacks sont donc appelés dans le thread de Tk.
+    """
+
+    def __init__(self, root, poll_interval=100):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.current = None
+        self.next_id = 0
+
+    def submit(self, func, on_progress, on_done, on_error):
+        """Lance func(job) en arrière-plan après avoir annulé la tâche en cours"""
+        self.cancel()
+        self.next_id += 1
+        job = Job(self.next_id)
+        self.current = job
+        future = Future()
+        future.set_running_or_notify_cancel()
+        threading.Thread(target=self._run, args=(func, job, future), daemon=True,
+                         name=f"job-{job.id}").start()
+        self.root.after(self.poll_interval, self._poll, job, future, on_progress, on_done, on_error)
+        return job
+
+    @staticmethod
+    def _run(func, job, future):
+        try:
+            future.set_result(func(job))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            job.done.set()
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+
+    def is_running(self):
+        return self.current is not None
+
+    def _poll(self, job, future, on_progress, on_done, on_error):
+        # Une tâche remplacée ou annulée ne met plus l'interface à jour
+        if job is not self.current:
+            return
+        while True:
+            try:
+                stage, detail = job.messages.get_nowait()
+            except queue.Empty:
+                break
+            on_progress(stage, detail)
+
+        if not future.done():
+            self.root.after(self.poll_interval, self._poll, job, future, on_progress, on_done, on_error)
+            return
+
+        self.current = None
+        error = future.exception()
+        if isinstance(error, JobCancelled):
+            return
+        if error is not None:
+            on_error(error)
+        else:
+            on_done(future.result())
+
+    def shutdown(self):
+        # Les threads sont des démons : une tâche annulée ne retient pas la fermeture
+        self.cancel()
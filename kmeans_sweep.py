@@ -0,0 +1,143 @@
+import os
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from threadpoolctl import threadpool_limits
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score, pairwise_distances_argmin_min
+from clustering import project_to_metres
+from sampling import stratified_positions
+
+# Nombre de points utilisés pour le score silhouette (calcul en O(n²))
+SILHOUETTE_SAMPLE = 5000
+# Longueur minimale d'une suite de k : en dessous, la reprise des centroïdes du k précédent sert peu
+MIN_CHAIN_LENGTH = 4
+
+
+def _next_centers(X, centers, rng):
+    """Centres de départ pour k+1 clusters : ceux de k plus un point tiré comme dans k-means++"""
+    distances = pairwise_distances_argmin_min(X, centers)[1] ** 2
+    total = distances.sum()
+    if total == 0:
+        new = X[rng.integers(len(X))]
+    else:
+        new = X[rng.choice(len(X), p=distances / total)]
+    return np.vstack([centers, new])
+
+
+def _run_chain(X, k_values, silhouette_sample, random_state, n_threads, results, cancelled):
+    """Calcule une suite de k consécutifs, chaque k partant des centroïdes du précédent.
+
+    Exécuté dans un processus de travail : chaque k terminé est envoyé dans la file results.
+    """
+    try:
+        _fit_chain(X, k_values, silhouette_sample, random_state, n_threads, results, cancelled)
+    except (ConnectionError, EOFError):
+        # Balayage annulé : le gestionnaire de la file a été arrêté
+        return
+
+
+def _fit_chain(X, k_values, silhouette_sample, random_state, n_threads, results, cancelled):
+    # Partager les cœurs entre les processus plutôt que de lancer tous les threads partout
+    threadpool_limits(n_threads)
+    rng = np.random.default_rng(random_state + k_values[0])
+    centers = None
+    for k in k_values:
+        if cancelled.is_set():
+            return
+        if centers is None:
+            kmeans = KMeans(n_clusters=k, random_state=random_state)
+        else:
+            kmeans = KMeans(n_clusters=k, init=_next_centers(X, centers, rng), n_init=1)
+        kmeans.fit(X)
+        centers = kmeans.cluster_centers_
+
+        sample = stratified_positions(kmeans.labels_, silhouette_sample, rng)
+        score = silhouette_score(X[sample], kmeans.labels_[sample])
+        results.put({'k': k, 'inertia': kmeans.inertia_, 'silhouette': score})
+
+
+def split_chains(k_values, n_chains):
+    """Découpe les k en suites consécutives de charge équilibrée (le coût croît avec k)"""
+    k_values = list(k_values)
+    n_chains = max(1, min(n_chains, len(k_values)))
+    load = np.cumsum(k_values) / np.sum(k_values)
+    chain = np.minimum((load * n_chains - 1e-9).astype(int), n_chains - 1)
+    return [[k for k, c in zip(k_values, chain) if c == i] for i in range(n_chains) if (chain == i).any()]
+
+
+class KMeansSweep:
+    """Balayage de k pour la méthode du coude, sur un pool de processus.
+
+    Les k sont répartis en suites consécutives d'au moins MIN_CHAIN_LENGTH valeurs, une par
+    processus ; dans une suite chaque k part des centroïdes du k précédent. Le score silhouette est calculé sur un échantillon
+    stratifié par cluster. Les résultats arrivent au fil de l'eau (poll) et le balayage
+    peut être annulé à tout moment.
+    """
+
+    def __init__(self, X, k_values, silhouette_sample=SILHOUETTE_SAMPLE, n_workers=None, random_state=42):
+        self.X = project_to_metres(X)
+        self.k_values = list(k_values)
+        self.silhouette_sample = silhouette_sample
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.random_state = random_state
+        self.results = {}
+        self.executor = None
+        self.futures = []
+
+    def start(self):
+        self.manager = multiprocessing.Manager()
+        self.queue = self.manager.Queue()
+        self.cancelled = self.manager.Event()
+        chains = split_chains(self.k_values, min(self.n_workers, len(self.k_values) // MIN_CHAIN_LENGTH))
+        n_threads = max(1, (os.cpu_count() or 1) // len(chains))
+        self.executor = ProcessPoolExecutor(max_workers=len(chains))
+        self.futures = [self.executor.submit(_run_chain, self.X, chain, self.silhouette_sample,
+                                             self.random_state, n_threads, self.queue, self.cancelled)
+                        for chain in chains]
+        return self
+
+    def poll(self):
+        """Nouveaux résultats arrivés depuis le dernier appel (liste de dictionnaires)"""
+        new = []
+        while True:
+            try:
+                result = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.results[result['k']] = result
+            new.append(result)
+        # Remonter l'erreur d'un processus de travail
+        for future in self.futures:
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                self.cancel()
+                raise future.exception()
+        return new
+
+    def done(self):
+        return all(future.done() for future in self.futures) and self.queue.empty()
+
+    def curves(self):
+        """k, inertie et score silhouette des k déjà calculés, dans l'ordre des k"""
+        ks = sorted(self.results)
+        return (ks, [self.results[k]['inertia'] for k in ks], [self.results[k]['silhouette'] for k in ks])
+
+    def cancel(self):
+        """Arrête le balayage sans attendre : les k en cours sont abandonnés"""
+        if self.executor is not None:
+            self.cancelled.set()
+            # Un processus en plein KMeans.fit ne regarde pas cancelled : on l'arrête
+            processes = list((self.executor._processes or {}).values())
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+            self.executor = None
+            self.manager.shutdown()
+
+    def close(self):
+        """Libère le pool de processus une fois le balayage terminé"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.manager.shutdown()
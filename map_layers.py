@@ -0,0 +1,308 @@
+import base64
+import json
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from jinja2 import Template
+
+
+def encode_array(values, dtype):
+    """Encode un tableau numpy en base64 (little-endian), relu en JavaScript comme un tableau typé"""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+class ClusterTable(MacroElement):
+    """Table des clusters partagée par les couches de la carte : nom, nombre de points et
+    graphique temporel de chaque cluster.
+
+    Les popups sont construits au clic à partir de cette table, au lieu d'un bloc HTML
+    écrit dans la page pour chaque polygone et chaque point.
+
+    names  : nom de chaque cluster (dictionnaire cluster -> nom, -1 pour le bruit)
+    counts : nombre de points de chaque cluster
+    plots  : chemin du graphique temporel de chaque cluster qui en a un
+    show_time_plots : si les graphiques ont été demandés (sinon pas de mention dans le popup)
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = {{ this.payload }};
+        {{ this.get_name() }}.popup = function(c) {
+            var html = '<div style="min-width: 200px;"><b>' + this.names[c] + '</b><br>' +
+                       'Nombre de points : ' + this.counts[c];
+            if (this.showTimePlots) {
+                var plot = this.plots[c];
+                if (plot) {
+                    html += '<br><button onclick="window.open(\\'./' + plot + '\\', ' +
+                            '\\'Distribution temporelle\\', \\'width=800,height=600\\'); return false;">' +
+                            'Voir distribution temporelle</button>';
+                } else {
+                    html += '<br>(Données temporelles non disponibles)';
+                }
+            }
+            return html + '</div>';
+        };
+        {% endmacro %}
+    """)
+
+    def __init__(self, names, counts, plots, show_time_plots):
+        super().__init__()
+        self._name = 'ClusterTable'
+        self.payload = json.dumps({
+            'names': {str(c): name for c, name in names.items()},
+            'counts': {str(c): int(n) for c, n in counts.items()},
+            'plots': {str(c): path for c, path in plots.items()},
+            'showTimePlots': bool(show_time_plots),
+        }, ensure_ascii=False)
+
+
+class HullLayer(MacroElement):
+    """Polygones des clusters dans une seule couche GeoJSON, popups construits au clic.
+
+    hulls  : contours de chaque cluster (dictionnaire cluster -> liste d'anneaux de sommets (lat, long)) ;
+             un cluster en plusieurs morceaux (mode concave) devient un MultiPolygon
+    colors : couleur de chaque cluster, colors[0] pour le bruit
+    table  : ClusterTable de la carte
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        L.geoJSON({{ this.geojson }}, {
+            style: function(feature) {
+                var color = feature.properties.color;
+                return {color: color, weight: 2, fill: true, fillColor: color, fillOpacity: 0.2};
+            },
+            onEachFeature: function(feature, layer) {
+                layer.bindPopup(function() {
+                    return {{ this.table.get_name() }}.popup(feature.properties.cluster);
+                });
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, hulls, colors, table):
+        super().__init__()
+        self._name = 'HullLayer'
+        self.table = table
+        features = []
+        for cluster_id, rings in hulls.items():
+            # GeoJSON : (longitude, latitude), anneaux fermés
+            polygons = []
+            for points in rings:
+                ring = np.round(np.asarray(points)[:, ::-1], 6).tolist()
+                ring.append(ring[0])
+                polygons.append([ring])
+            if len(polygons) == 1:
+                geometry = {'type': 'Polygon', 'coordinates': polygons[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'coordinates': polygons}
+            features.append({
+                'type': 'Feature',
+                'properties': {'cluster': int(cluster_id), 'color': colors[cluster_id + 1]},
+                'geometry': geometry,
+            })
+        self.geojson = json.dumps({'type': 'FeatureCollection', 'features': features})
+
+
+class GridLayer(MacroElement):
+    """Densité des photos sur une grille (hexagones ou carrés) : une seule couche GeoJSON.
+
+    La couleur de chaque cellule dépend de son nombre de photos (colormap, en paliers
+    géométriques) ; le popup, construit au clic, donne aussi le nombre d'utilisateurs
+    distincts et le nom du cluster dominant (lu dans la ClusterTable).
+
+    grid     : DataFrame de grid_aggregation.aggregate_grid
+    colormap : colormap branca des nombres de photos (sa légende est ajoutée à la carte)
+    table    : ClusterTable de la carte
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        L.geoJSON({{ this.geojson }}, {
+            style: function(feature) {
+                return {color: feature.properties.fill, weight: 0.5, fillColor: feature.properties.fill,
+                        fillOpacity: 0.6};
+            },
+            onEachFeature: function(feature, layer) {
+                layer.bindPopup(function() {
+                    var p = feature.properties;
+                    return '<div style="min-width: 200px;"><b>' + p.count + ' photos</b><br>' +
+                           p.users + ' utilisateurs distincts<br>' +
+                           'Cluster dominant : ' + {{ this.table.get_name() }}.names[p.cluster] + '</div>';
+                });
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, grid, colormap, table):
+        super().__init__()
+        self._name = 'GridLayer'
+        self.table = table
+        features = []
+        for count, users, cluster, vertices in grid[['count', 'users', 'cluster', 'vertices']].itertuples(index=False):
+            ring = np.round(vertices[:, ::-1], 6).tolist()
+            ring.append(ring[0])
+            features.append({
+                'type': 'Feature',
+                'properties': {'count': int(count), 'users': int(users), 'cluster': int(cluster),
+                               'fill': colormap(count)},
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            })
+        self.geojson = json.dumps({'type': 'FeatureCollection', 'features': features})
+
+
+def count_colormap(counts, caption="Photos par cellule"):
+    """Colormap en paliers géométriques (1, 2, 5, ...) adaptée à des comptes très dispersés"""
+    from branca.colormap import linear
+
+    breaks = np.unique(np.round(np.geomspace(1, max(int(np.max(counts)), 2), 7)))
+    colormap = linear.YlOrRd_09.to_step(index=list(breaks))
+    colormap.caption = caption
+    return colormap
+
+
+class PointCanvasLayer(MacroElement):
+    """Couche de points dessinée sur un seul canvas Leaflet.
+
+    Les coordonnées, les clusters et les informations des popups sont transmis sous forme
+    de tableaux typés encodés en base64 (quelques octets par point) au lieu d'un marqueur
+    et d'un popup HTML par point. Le canvas est redessiné à chaque déplacement de la carte,
+    en regroupant les points par couleur ; le popup est construit au clic, à partir du
+    point le plus proche.
+
+    lat, lon     : coordonnées des points
+    cluster      : cluster de chaque point (-1 pour le bruit)
+    colors       : couleur de chaque cluster, colors[0] pour le bruit
+    table        : ClusterTable de la carte (noms des clusters pour les popups)
+    users, ids   : propriétaire et identifiant Flickr de chaque point (lien du popup)
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            function decode(text, Type) {
+                var bytes = Uint8Array.from(atob(text), function(c) { return c.charCodeAt(0); });
+                return new Type(bytes.buffer);
+            }
+            var data = {{ this.payload }};
+            var lat = decode(data.lat, Float32Array);
+            var lon = decode(data.lon, Float32Array);
+            var cluster = decode(data.cluster, Int32Array);
+            var userCodes = decode(data.user, Int32Array);
+            var ids = decode(data.id, Float64Array);
+            var n = lat.length;
+
+            // Coordonnées Web Mercator normalisées (0..1), calculées une seule fois
+            var mx = new Float64Array(n), my = new Float64Array(n);
+            for (var i = 0; i < n; i++) {
+                var s = Math.sin(lat[i] * Math.PI / 180);
+                mx[i] = (lon[i] + 180) / 360;
+                my[i] = 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+            }
+
+            var PointCanvas = L.Layer.extend({
+                onAdd: function(map) {
+                    this._map = map;
+                    this._canvas = L.DomUtil.create('canvas', 'leaflet-zoom-hide');
+                    // Le canvas couvre la carte : les clics passent aux polygones, ceux sur les
+                    // points sont traités par map.on('click')
+                    this._canvas.style.pointerEvents = 'none';
+                    map.getPanes().overlayPane.appendChild(this._canvas);
+                    map.on('moveend zoomend resize', this._redraw, this);
+                    map.on('click', this._click, this);
+                    this._redraw();
+                },
+                onRemove: function(map) {
+                    L.DomUtil.remove(this._canvas);
+                    map.off('moveend zoomend resize', this._redraw, this);
+                    map.off('click', this._click, this);
+                },
+                _pixels: function() {
+                    var map = this._map;
+                    var scale = 256 * Math.pow(2, map.getZoom());
+                    var origin = map.getPixelBounds().min;
+                    return {scale: scale, x0: origin.x, y0: origin.y};
+                },
+                _redraw: function() {
+                    var map = this._map, size = map.getSize();
+                    var topLeft = map.containerPointToLayerPoint([0, 0]);
+                    L.DomUtil.setPosition(this._canvas, topLeft);
+                    this._canvas.width = size.x;
+                    this._canvas.height = size.y;
+                    var ctx = this._canvas.getContext('2d');
+                    var p = this._pixels();
+                    // Les points sont triés par cluster : un tracé par couleur
+                    for (var g = 0; g < data.groups.length; g++) {
+                        var group = data.groups[g];
+                        var r = group.radius;
+                        ctx.beginPath();
+                        for (var i = group.start; i < group.end; i++) {
+                            var x = mx[i] * p.scale - p.x0, y = my[i] * p.scale - p.y0;
+                            if (x < -r || y < -r || x > size.x + r || y > size.y + r) continue;
+                            ctx.moveTo(x + r, y);
+                            ctx.arc(x, y, r, 0, 2 * Math.PI);
+                        }
+                        ctx.globalAlpha = group.opacity;
+                        ctx.fillStyle = group.color;
+                        ctx.fill();
+                        ctx.globalAlpha = Math.min(1, group.opacity + 0.3);
+                        ctx.strokeStyle = group.color;
+                        ctx.lineWidth = 1;
+                        ctx.stroke();
+                    }
+                },
+                _click: function(e) {
+                    var p = this._pixels();
+                    var click = this._map.latLngToContainerPoint(e.latlng);
+                    var best = -1, bestDistance = Infinity;
+                    for (var i = 0; i < n; i++) {
+                        var dx = mx[i] * p.scale - p.x0 - click.x, dy = my[i] * p.scale - p.y0 - click.y;
+                        var d = dx * dx + dy * dy;
+                        if (d < bestDistance) { bestDistance = d; best = i; }
+                    }
+                    if (best < 0 || bestDistance > 36) return;
+                    var c = cluster[best];
+                    var link = 'https://www.flickr.com/photos/' + data.users[userCodes[best]] + '/' + ids[best];
+                    var html = '<div style="min-width: 200px;">Cluster: ' + {{ this.table.get_name() }}.names[c] + '<br>' +
+                               '<a href="' + link + '" target="_blank">Voir la photo sur Flickr</a></div>';
+                    L.popup().setLatLng([lat[best], lon[best]]).setContent(html).openOn(this._map);
+                }
+            });
+            new PointCanvas().addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, lat, lon, cluster, colors, table, users, ids):
+        super().__init__()
+        self._name = 'PointCanvasLayer'
+        self.table = table
+        cluster = np.asarray(cluster, dtype=np.int64)
+
+        # Trier par cluster (le bruit en premier, dessiné sous les clusters)
+        order = np.argsort(cluster, kind='stable')
+        cluster = cluster[order]
+        clusters, starts = np.unique(cluster, return_index=True)
+        ends = np.append(starts[1:], len(cluster))
+        groups = [{
+            'start': int(start),
+            'end': int(end),
+            'color': colors[c + 1] if c >= 0 else colors[0],
+            # Points non clusterisés plus petits et plus transparents
+            'radius': 5 if c >= 0 else 3,
+            'opacity': 0.7 if c >= 0 else 0.15,
+        } for c, start, end in zip(clusters, starts, ends)]
+
+        user_codes, user_vocab = pd.factorize(np.asarray(users, dtype=object)[order])
+        self.payload = json.dumps({
+            'lat': encode_array(np.asarray(lat)[order], '<f4'),
+            'lon': encode_array(np.asarray(lon)[order], '<f4'),
+            'cluster': encode_array(cluster, '<i4'),
+            'user': encode_array(user_codes, '<i4'),
+            'users': [str(u) for u in user_vocab],
+            'id': encode_array(np.asarray(ids)[order], '<f8'),
+            'groups': groups,
+        }, ensure_ascii=False)
+
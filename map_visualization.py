@@ -1,113 +1,70 @@
 import pandas as pd
 import folium
-from sklearn.cluster import DBSCAN, KMeans
+from clustering import GeoDBSCAN
 import numpy as np
-from scipy.spatial import ConvexHull
 import colorsys
-from collections import Counter
 import webbrowser
 import os
-import plotly.express as px
-import math
-from collections import defaultdict
-import unicodedata
+from tokenization import TokenizedDataset
+from cluster_naming import name_clusters
+from data_loader import load_dataset, STUDY_AREA
+from map_layers import ClusterTable, HullLayer, PointCanvasLayer, GridLayer, count_colormap
+from grid_aggregation import aggregate_grid
+from plot_bundle import write_plot_bundle
+from time_cube import TimeCube
+from sampling import stratified_positions
+from partition import ClusterPartition
+from hulls import cluster_hulls
+from tiles import build_tile_pyramid, TILES_DIR, MIN_ZOOM, MAX_ZOOM
 
 show_time_plots = True  # Valeur par défaut
 time_grouping = "mois"  # Valeur par défaut
+time_cube = None  # TimeCube des points de la dernière carte, calculé une seule fois (lu par l'interface)
+tokens = None  # TokenizedDataset du jeu de données complet (sinon calculé à partir de df)
+point_display = "points"  # "points" (canvas), "tuiles" (pyramide pré-calculée), "hexagones" ou "carrés" (densité par cellule)
+grid_cell_size = 100  # pas de la grille de densité, en mètres
+hull_mode = "convexe"  # forme des polygones des clusters : "convexe" ou "concave" (alpha-shape)
+hull_tolerance = 5  # tolérance de simplification des polygones, en mètres (0 = aucune)
+hull_alpha = 100  # rayon maximal des triangles gardés en mode concave, en mètres
+region = None  # zone choisie dans l'interface (sommets (lat, long), 2 = rectangle), None = zone d'étude
+display_points = None  # nombre maximal de points dessinés un à un (None = tous)
+n_displayed_points = 0  # nombre de points effectivement représentés sur la dernière carte
+search_terms = []  # termes de la recherche par tag (tag_index.query_terms)
+keep_search_tag = False  # ne pas exclure les termes recherchés des noms de clusters
+progress = None  # Job de l'interface : reçoit les étapes et permet d'annuler (None en ligne de commande)
+
+def report(stage, detail=""):
+    """Signale l'avancement à l'interface (lève JobCancelled si la génération a été annulée)"""
+    if progress is not None:
+        progress.report(stage, detail)
 
-def remove_accents(text):
-    text = unicodedata.normalize('NFD', text)
-    text = text.encode('ascii', 'ignore').decode('utf-8')
-    return text
-
-def generate_time_distribution_plot(cluster_data, cluster_id, cluster_name):
-    """Génère un graphique de distribution temporelle pour un cluster"""
+def main():
     try:
-        # Créer une copie du DataFrame pour éviter les warnings
-        cluster_data = cluster_data.copy()
-        
-        try:
-            # Convertir explicitement la colonne date_taken en datetime
-            cluster_data['date_taken'] = pd.to_datetime(cluster_data['date_taken'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-            
-            # Supprimer les lignes avec des dates invalides
-            cluster_data = cluster_data.dropna(subset=['date_taken'])
-            
-            if len(cluster_data) == 0:
-                print(f"Aucune donnée valide pour le cluster {cluster_id}")
-                return None
-            
-            # Regrouper selon le choix de l'utilisateur
-            if time_grouping == "mois":
-                # Grouper par mois
-                daily_counts = (cluster_data.groupby(pd.Grouper(key='date_taken', freq='ME'))
-                              .size()
-                              .to_frame(name='count')
-                              .reset_index())
-                daily_counts['date'] = daily_counts['date_taken'].dt.strftime('%Y-%m')
-                x_title = "Mois"
-            else:  # année
-                # Créer directement une colonne année
-                daily_counts = (cluster_data.assign(year=lambda x: x['date_taken'].dt.year)
-                              .groupby('year')
-                              .size()
-                              .reset_index(name='count'))
-                daily_counts.columns = ['date', 'count']
-                daily_counts['date'] = daily_counts['date'].astype(str)
-                daily_counts = daily_counts.sort_values('date')
-                x_title = "Année"
-            
-            # Vérifier si les données sont vides après le regroupement
-            if daily_counts.empty:
-                print(f"Aucune donnée après regroupement pour le cluster {cluster_id}")
-                return None
+        global df, clustering_algo, N, show_points, nb_points_cluster, show_time_plots, time_grouping, tokens, point_display, grid_cell_size, hull_mode, hull_tolerance, hull_alpha, region, time_cube, n_displayed_points
 
-            # Créer le graphique avec plotly
-            fig = px.line(daily_counts, x='date', y='count',
-                         title=f'Distribution temporelle du cluster {cluster_name} (ID: {cluster_id})')
-            
-            # Personnaliser le layout
-            fig.update_layout(
-                xaxis_title=x_title,
-                yaxis_title="Nombre de photos",
-                hovermode='x'
-            )
-            
-            # Si c'est un graphique par année, forcer l'affichage de toutes les années
-            if time_grouping == "année":
-                fig.update_xaxes(
-                    dtick=1,
-                    type='category',
-                    categoryorder='category ascending'
-                )
-            
-            # Sauvegarder le graphique
-            plot_path = os.path.join('cluster_plots', f'cluster_{cluster_id}_distribution.html')
-            fig.write_html(plot_path)
-            return f'cluster_plots/cluster_{cluster_id}_distribution.html'
-            
-        except Exception as e:
-            print(f"Erreur lors du traitement des données pour le cluster {cluster_id}: {str(e)}")
-            print(f"Types des données: {cluster_data['date_taken'].dtypes}")
-            print(f"Exemple de dates: {cluster_data['date_taken'].head()}")
-            return None
-            
-    except Exception as e:
-        print(f"Erreur lors de la génération du graphique pour le cluster {cluster_id}: {str(e)}")
-        return None
+        # L'index de df doit repérer les lignes du jeu de données tokenisé
+        if tokens is None:
+            df = df.reset_index(drop=True)
+            row_tokens = TokenizedDataset(df)
+        else:
+            row_tokens = tokens
 
-def main():
-    try:
-        global df, clustering_algo, N, show_points, nb_points_cluster, show_time_plots, time_grouping
+        # Si tous les points ont déjà été clusterisés, inutile de refaire le clustering
+        # (de même si l'algorithme garde ses labels sur l'échantillon, comme la hiérarchie HDBSCAN)
+        already_clustered = 'cluster' in df.columns and (
+            int(nb_points_cluster) >= len(df) or getattr(clustering_algo, 'keep_labels_on_sample', False))
 
         df = df.sample(n=min(int(nb_points_cluster), len(df)), random_state=42)
 
         print(f"Taille du DataFrame après échantillonnage: {df.shape}")
-        # Préparer les données pour la clusterisation
-        X = df[['lat', 'long']].values
-        
-        # Appliquer l'algorithme de clustering
-        df['cluster'] = clustering_algo.fit_predict(X)
+        report("Échantillonnage", f"{len(df)} points")
+        if not already_clustered:
+            report("Clustering", f"{len(df)} points")
+            # Préparer les données pour la clusterisation
+            X = df[['lat', 'long']].values
+            
+            # Appliquer l'algorithme de clustering
+            df['cluster'] = clustering_algo.fit_predict(X)
 
         # Prendre un échantillon aléatoire de nb_points_cluster points
        
@@ -115,147 +72,41 @@ def main():
         # Si K-means est utilisé, les clusters commencent à 0 et sont tous positifs
         # Pour DBSCAN, -1 représente le bruit
         
-        all_dataset = []
-
-        # Trouver les tags les plus communs dans tout le dataset
-        all_dataset_tags = []
-        for tags_str in df['tags'].fillna(''):
-            tags_list = tags_str.lower().split(',')
-            for tag in tags_list:
-                tag = tag.strip()
-                tag = remove_accents(tag)  # Normaliser le tag
-                mots_exclus = ['unknown', 'lyon', '', 'france', 'europe']
-                if tag not in mots_exclus and not any(c.isdigit() for c in tag):
-                    subtags = tag.replace('_', ' ').replace('-', ' ').split()
-                    all_dataset_tags.extend(subtags)
-
-        # Trouver les titres les plus communs dans tout le dataset
-        all_dataset_title = []
-        for title_str in df['title'].fillna(''):
-            title_list = tags_str.lower().split(',')
-            for title in title_list:
-                title = title.strip()
-                title = remove_accents(title)  # Normaliser le title
-                mots_exclus = ['unknown', 'lyon', '', 'france', 'europe']
-                if title not in mots_exclus and not any(c.isdigit() for c in title):
-                    subtitle = title.replace('_', ' ').replace('-', ' ').split()
-                    all_dataset_title.extend(subtitle)
+        # Tokens des tags et titres : découpés une seule fois par jeu de données
+        rows = df.index.to_numpy()
 
-        all_dataset.extend(all_dataset_tags + all_dataset_title)
-
-        # Trouver les N tags les plus communs dans tout le dataset (title + tags)
-        common_tags = [tag for tag, _ in Counter(all_dataset_tags).most_common(N)]
+        # Trouver les N tags les plus communs dans tout le dataset
+        common_tags = row_tokens.common_tags(rows, N)
         print("Tags les plus communs exclus:", common_tags)
 
         # Ajouter ces tags communs à la liste des mots exclus
         mots_exclus = ['unknown', 'lyon', '', 'france', 'europe','nuit','streetphotography','french','creative','basilique','wheatpaste']
         
-        # Si l'option est activée et qu'un tag de recherche est présent, ne pas l'exclure
-        search_term = getattr(df, 'search_term', None)
-        keep_search_tag = getattr(df, 'keep_search_tag', False)
-        
-        if keep_search_tag and search_term:
-            # Ne pas ajouter le tag recherché aux mots exclus
-            mots_exclus.extend(tag for tag in common_tags if tag != search_term)
-        else:
-            if keep_search_tag and search_term:
-                mots_exclus.extend(tag for tag in common_tags if tag != search_term)
-            else:
-                pass  # Ne pas exclure les tags communs
+        # Si l'option est activée et qu'une recherche par tag est faite, exclure les tags
+        # communs sauf les termes recherchés (sinon les tags communs ne sont pas exclus)
+        if keep_search_tag and search_terms:
+            mots_exclus.extend(tag for tag in common_tags if tag not in search_terms)
         
         print("Mots exclus:", mots_exclus)
 
+        # Lignes de chaque cluster (un seul tri des labels, partagé par toutes les étapes)
+        partition = ClusterPartition(df['cluster'].to_numpy())
 
-        # Trouver les noms de clusters avec TF-IDF
-        cluster_tags = {}
-        unique_clusters = sorted(df['cluster'].unique())
-        
-        # Exclure le cluster de bruit (-1) pour le calcul des fréquences
-        clusters_for_tfidf = [c for c in unique_clusters if c != -1]
-        total_clusters = len(clusters_for_tfidf)
-        
-        # Étape 1: Collecter la fréquence des documents (nombre de clusters où chaque tag apparaît)
-        doc_freq = defaultdict(int)
-        for cluster_id in clusters_for_tfidf:
-            cluster_data = df[df['cluster'] == cluster_id]
-            all_tags = []
-            
-            for tags_str in cluster_data['tags'].fillna(''):
-                tags_list = tags_str.lower().split(',')
-                for tag in tags_list:
-                    tag = tag.strip()
-                    tag = remove_accents(tag)
-                    if tag not in mots_exclus and not any(c.isdigit() for c in tag):
-                        subtags = [tag.replace('_', ' ').replace('-', ' ').strip()]
-                        all_tags.extend(subtags)
-
-            for title_str in cluster_data['title'].fillna(''):
-                title_words = remove_accents(title_str).lower().split()
-                for word in title_words:
-                    word = word.strip()
-                    if word not in mots_exclus and not any(c.isdigit() for c in word):
-                        all_tags.extend(word.split())
-                        
-            unique_tags = set(all_tags)
-            for tag in unique_tags:
-                doc_freq[tag] += 1
-        
-        # Étape 2: Calculer le score TF-IDF pour chaque tag dans chaque cluster
-        for cluster_id in unique_clusters:
-            if cluster_id == -1:
-                cluster_tags[cluster_id] = "Non clustérisé"
-                continue
-            
-            cluster_data = df[df['cluster'] == cluster_id]
-            all_tags = []
-            for tags_str in cluster_data['tags'].fillna(''):
-                tags_list = tags_str.lower().split(',')
-                for tag in tags_list:
-                    tag = tag.strip()
-                    tag = remove_accents(tag)
-                    if tag not in mots_exclus and not any(c.isdigit() for c in tag):
-                        subtags = tag.replace('_', ' ').replace('-', ' ').split()
-                        all_tags.extend(subtags)
-            
-            tag_counts = Counter(all_tags)
-            scores = {}
-            total_terms = sum(tag_counts.values())
-
-            for tag, count in tag_counts.items():
-                if len(tag) <= 2 or ' ' in tag or tag in mots_exclus:
-                    continue
-                
-                # TF normalisé
-                tf = count / total_terms if total_terms > 0 else 0
-                
-                # IDF ajusté
-                df_count = doc_freq.get(tag, 0)
-                idf = math.log(total_clusters / (df_count + 1e-6))
-                
-                scores[tag] = tf * idf
-            
-            # Sélection adaptative
-            if scores:
-                best_score = max(scores.values())
-                threshold = 0.7 * best_score
-                best_tags = [tag.capitalize() for tag, score in scores.items() if score >= threshold]
-                
-                # Récupérer au moins 1 tag pour les petits clusters
-                if not best_tags and scores:
-                    best_tags = [max(scores, key=scores.get).capitalize()]
-                    
-                cluster_tags[cluster_id] = ', '.join(best_tags[:3])
-            else:
-                cluster_tags[cluster_id] = f"Cluster {cluster_id}"
+        # Trouver les noms de clusters avec TF-IDF (tous les clusters en une seule passe)
+        report("Nommage des clusters")
+        cluster_tags = name_clusters(row_tokens, rows, partition, mots_exclus)
 
         # Nombre de clusters trouvés (excluant le bruit qui est -1)
-        n_clusters = len(set(df['cluster'])) - (1 if -1 in df['cluster'] else 0)
+        cluster_ids = partition.clusters[partition.clusters >= 0]
+        n_clusters = len(cluster_ids)
         print(f"Nombre de clusters trouvés : {n_clusters}")
+        report("Nommage des clusters", f"{n_clusters} clusters trouvés")
 
-        # Générer des couleurs aléatoires pour chaque cluster
+        # Générer des couleurs aléatoires pour chaque cluster (une par label, même absent de l'échantillon)
+        n_colors = int(cluster_ids.max()) + 1 if n_clusters else 0
         colors = []
-        for i in range(n_clusters):
-            hue = i / n_clusters
+        for i in range(n_colors):
+            hue = i / n_colors
             rgb = colorsys.hsv_to_rgb(hue, 0.8, 0.8)
             color = '#{:02x}{:02x}{:02x}'.format(int(rgb[0]*255), int(rgb[1]*255), int(rgb[2]*255))
             colors.append(color)
@@ -275,134 +126,99 @@ def main():
         ]
         print(bounds)
 
-        bounds = [[45.73, 4.79], [45.80, 4.90]]
-        
-        folium.Rectangle(
-            bounds=bounds,
-            color='red',
-            weight=2,
-            fill=False,
-            popup='Zone d\'étude',
-            opacity=0.7
-        ).add_to(carte)
-
-        # Créer un dictionnaire pour stocker les points de chaque cluster
-        cluster_points = {}
-        for cluster_id in unique_clusters:
-            cluster_points[cluster_id] = df[df['cluster'] == cluster_id]
-        
-        # Créer un dossier pour les graphiques si nécessaire
-        plots_dir = 'cluster_plots'
-        if show_time_plots:
-            if not os.path.exists(plots_dir):
-                os.makedirs(plots_dir)
-            
-            # Nettoyer le dossier des anciens graphiques
-            for file in os.listdir(plots_dir):
-                if file.endswith('.html'):
-                    os.remove(os.path.join(plots_dir, file))
-        
-        # Générer les graphiques pour chaque cluster
+        # Zone analysée : la zone choisie dans l'interface, sinon la zone d'étude
+        if region is not None and len(region) > 2:
+            folium.Polygon(
+                locations=np.asarray(region).tolist(),
+                color='red',
+                weight=2,
+                fill=False,
+                popup='Zone analysée',
+                opacity=0.7
+            ).add_to(carte)
+        else:
+            bounds = np.asarray(region if region is not None else STUDY_AREA)
+            folium.Rectangle(
+                bounds=[bounds.min(axis=0).tolist(), bounds.max(axis=0).tolist()],
+                color='red',
+                weight=2,
+                fill=False,
+                popup='Zone analysée' if region is not None else 'Zone d\'étude',
+                opacity=0.7
+            ).add_to(carte)
+
+        # Générer les polygones de tous les clusters (une passe sur la partition)
+        report("Polygones", f"{n_clusters} clusters")
+        hulls = cluster_hulls(df[['lat', 'long']].to_numpy(), partition,
+                              mode=hull_mode, tolerance=float(hull_tolerance), alpha=float(hull_alpha))
+        print(f"{sum(len(ring) for rings in hulls.values() for ring in rings)} sommets de polygones ({hull_mode})")
+        
+        # Distributions temporelles de tous les clusters : une page et un fichier de données
+        # (comptes par cluster et par jour, agrégés une seule fois)
+        time_cube = TimeCube(partition, df['date_taken'])
         plot_paths = {}
-        for cluster_id in range(n_clusters):
-            cluster_data = df[df['cluster'] == cluster_id]
-            if len(cluster_data) >= 3:
-                try:
-                    cluster_points = cluster_data[['lat', 'long']].values
-                    jittered_points = cluster_points + np.random.normal(0, 1e-10, cluster_points.shape)
-                    hull = ConvexHull(jittered_points)
-                    hull_points = jittered_points[hull.vertices]
-                    polygon_points = [[point[0], point[1]] for point in hull_points]
-                    
-                    # Utiliser le tag le plus représentatif dans le popup
-                    cluster_name = cluster_tags[cluster_id]
-                    nb_points = len(cluster_data)
-                    
-                    # Générer le popup selon que les graphiques sont activés ou non
-                    if show_time_plots:
-                        # Générer le graphique de distribution
-                        plot_path = generate_time_distribution_plot(
-                            cluster_data, 
-                            cluster_id,
-                            cluster_name
-                        )
-                        if plot_path: 
-                            plot_paths[cluster_id] = plot_path
-                            popup_content = f"""
-                            <div style="min-width: 200px;">
-                            <b>{cluster_name}</b><br>
-                            Nombre de points : {nb_points}<br>
-                            <button onclick="window.open('./{plot_path}', 
-                                'Distribution temporelle', 
-                                'width=800,height=600'); return false;">
-                                Voir distribution temporelle
-                            </button>
-                            </div>
-                            """
-                        else:
-                            popup_content = f"""
-                            <div style="min-width: 200px;">
-                            <b>{cluster_name}</b><br>
-                            Nombre de points : {nb_points}<br>
-                            (Données temporelles non disponibles)
-                            </div>
-                            """
-                    else:
-                        popup_content = f"""
-                        <div style="min-width: 200px;">
-                        <b>{cluster_name}</b><br>
-                        Nombre de points : {nb_points}
-                        </div>
-                        """
-                    
-                    folium.Polygon(
-                        locations=polygon_points,
-                        color=colors[cluster_id + 1],
-                        weight=2,
-                        fill=True,
-                        fill_color=colors[cluster_id + 1],
-                        fill_opacity=0.2,
-                        popup=popup_content
-                    ).add_to(carte)
-                    
-                except Exception as e:
-                    print(f"Erreur lors de la création du polygone pour le cluster {cluster_id}: {str(e)}")
-                    continue
+        if show_time_plots:
+            report("Graphiques temporels")
+            plot_paths = write_plot_bundle(time_cube, list(hulls), cluster_tags, time_grouping)
+        
+        # Table des clusters (noms, nombres de points, graphiques) : les popups sont construits au clic
+        table = ClusterTable(
+            names=cluster_tags,
+            counts=partition.counts(),
+            plots=plot_paths,
+            show_time_plots=show_time_plots,
+        )
+        table.add_to(carte)
+        HullLayer(hulls, colors, table).add_to(carte)
         
         # Ajouter les points si l'option est activée
-        if show_points:
-            # Ajouter chaque point à la carte avec la couleur de son cluster
-            for idx, row in df.iterrows():
-                color_idx = row['cluster'] + 1 if row['cluster'] >= 0 else 0
-                
-                # Utiliser le tag le plus représentatif dans le popup
-                cluster_name = cluster_tags[row['cluster']] if row['cluster'] >= 0 else "Non clustérisé"
-                
-                # Créer le lien Flickr
-                flickr_link = f"https://www.flickr.com/photos/{row['user']}/{row['id']}"
-                
-                # Créer le popup avec le lien HTML et un style pour une largeur fixe
-                popup_content = f"""
-                <div style="min-width: 200px;">
-                Cluster: {cluster_name}<br>
-                <a href="{flickr_link}" target="_blank">Voir la photo sur Flickr</a>
-                </div>
-                """
-                
-                # Ajuster la taille et l'opacité selon que le point est dans un cluster ou non
-                radius = 5 if row['cluster'] >= 0 else 3
-                opacity = 0.7 if row['cluster'] >= 0 else 0.15
-                
-                folium.CircleMarker(
-                    location=[row['lat'], row['long']],
-                    radius=radius,  # Plus petit pour les points non clusterisés
-                    color=colors[color_idx],
-                    fill=True,
-                    popup=popup_content,
-                    fill_opacity=opacity  # Plus transparent pour les points non clusterisés
-                ).add_to(carte)
+        n_displayed_points = len(df) if show_points else 0
+        if show_points and point_display == "tuiles":
+            # Densité des points pré-rendue en tuiles : le navigateur ne charge que les tuiles visibles
+            n_tiles = build_tile_pyramid(
+                df['lat'].to_numpy(), df['long'].to_numpy(), df['cluster'].to_numpy(), colors,
+                progress=lambda zoom: report("Tuiles", f"zoom {zoom} / {MAX_ZOOM}"))
+            print(f"{n_tiles} tuiles écrites dans {TILES_DIR}")
+            folium.TileLayer(
+                tiles=TILES_DIR + '/{z}/{x}/{y}.png',
+                attr='Photos Flickr',
+                name='Densité des photos',
+                overlay=True,
+                min_zoom=MIN_ZOOM,
+                max_native_zoom=MAX_ZOOM,
+                max_zoom=19
+            ).add_to(carte)
+        elif show_points and point_display in ("hexagones", "carrés"):
+            # Densité par cellule : le coût dépend du nombre de cellules occupées, pas de photos
+            report("Grille de densité", f"cellules de {grid_cell_size} m")
+            grid = aggregate_grid(df, size=float(grid_cell_size),
+                                  shape='hex' if point_display == "hexagones" else 'square')
+            print(f"{len(grid)} cellules occupées")
+            colormap = count_colormap(grid['count'])
+            GridLayer(grid, colormap, table).add_to(carte)
+            colormap.add_to(carte)
+        elif show_points:
+            # Échantillon stratifié par cluster si trop de points (positions dans df, sans copie)
+            labels = df['cluster'].to_numpy()
+            if display_points is not None:
+                shown = stratified_positions(labels, int(display_points), random_state=42)
+            else:
+                shown = np.arange(len(df))
+            report("Points", f"{len(shown)} points")
+            # Tous les points dans une seule couche canvas (tableaux compacts, popups construits au clic)
+            PointCanvasLayer(
+                lat=df['lat'].to_numpy()[shown],
+                lon=df['long'].to_numpy()[shown],
+                cluster=labels[shown],
+                colors=colors,
+                table=table,
+                users=df['user'].to_numpy(dtype=object)[shown],
+                ids=df['id'].to_numpy()[shown],
+            ).add_to(carte)
+            n_displayed_points = len(shown)
         
         # Sauvegarder la carte en HTML
+        report("Enregistrement de la carte")
         carte.save('carte_photos.html')
         webbrowser.open('file://' + os.path.realpath('carte_photos.html'))
         
@@ -413,9 +229,9 @@ def main():
 
 if __name__ == "__main__":
     # Configuration par défaut si exécuté directement
-    df = pd.read_csv('flickr_data_cleaned.csv', low_memory=False)
+    df = load_dataset('flickr_data_cleaned.csv')
     df = df.head(10000)
-    clustering_algo = DBSCAN(eps=0.0003, min_samples=5)
+    clustering_algo = GeoDBSCAN(eps=33, min_samples=5)
     N = 100
     show_points = True
     nb_points_cluster = 1000
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class ClusterPartition:
+    """Lignes de chaque cluster, obtenues avec un seul tri des labels.
+
+    positions : positions des lignes triées par cluster (ordre d'origine conservé dans un cluster)
+    offsets   : les lignes du i-ème cluster sont positions[offsets[i]:offsets[i + 1]]
+    clusters  : labels distincts, dans l'ordre croissant (-1, le bruit, en premier s'il existe)
+    group     : indice (dans clusters) du cluster de chaque ligne
+
+    rows(cluster_id) renvoie une vue sur positions, sans copie, en temps constant.
+    """
+
+    def __init__(self, labels):
+        labels = np.asarray(labels, dtype=np.int64)
+        self.n_rows = len(labels)
+        self.positions = np.argsort(labels, kind='stable')
+        sorted_labels = labels[self.positions]
+        starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]]) if len(labels) else np.empty(0, dtype=np.int64)
+        self.clusters = sorted_labels[starts]
+        self.offsets = np.r_[starts, len(labels)].astype(np.int64)
+        self.group = np.empty(len(labels), dtype=np.int64)
+        self.group[self.positions] = np.repeat(np.arange(len(self.clusters)), np.diff(self.offsets))
+
+        # Table label -> indice du cluster (les labels sont des entiers >= -1)
+        top = int(self.clusters[-1]) + 2 if len(self.clusters) else 1
+        self._slot = np.full(top, -1, dtype=np.int64)
+        self._slot[self.clusters + 1] = np.arange(len(self.clusters))
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def __contains__(self, cluster_id):
+        return 0 <= cluster_id + 1 < len(self._slot) and self._slot[cluster_id + 1] >= 0
+
+    def index(self, cluster_id):
+        """Indice du cluster dans clusters (-1 s'il n'existe pas)"""
+        if not 0 <= cluster_id + 1 < len(self._slot):
+            return -1
+        return int(self._slot[cluster_id + 1])
+
+    def rows(self, cluster_id):
+        """Positions des lignes d'un cluster (vue, vide si le cluster n'existe pas)"""
+        i = self.index(cluster_id)
+        if i < 0:
+            return self.positions[:0]
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def sizes(self):
+        """Nombre de lignes de chaque cluster, dans l'ordre de clusters"""
+        return np.diff(self.offsets)
+
+    def counts(self):
+        """Dictionnaire cluster -> nombre de lignes"""
+        return dict(zip(self.clusters.tolist(), self.sizes().tolist()))
@@ -0,0 +1,104 @@
+import os
+import json
+import plotly
+from plotly.offline import get_plotlyjs
+
+PLOTS_DIR = 'cluster_plots'
+PAGE_FILE = 'distribution.html'
+DATA_FILE = 'distribution_data.js'
+
+# Page unique des distributions temporelles : plotly est chargé une fois, les séries de tous
+# les clusters sont lues dans DATA_FILE et le cluster affiché est passé dans l'URL (?cluster=id)
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Distribution temporelle</title>
+<script src="{plotly_file}"></script>
+<script src="{data_file}"></script>
+</head>
+<body style="margin: 0;">
+<div style="padding: 5px 10px;">
+    Regrouper par :
+    <select id="grouping" onchange="draw(this.value)">
+        <option value="mois">mois</option>
+        <option value="année">année</option>
+    </select>
+</div>
+<div id="plot" style="width: 100%; height: calc(100vh - 40px);"></div>
+<script>
+    var id = new URLSearchParams(window.location.search).get('cluster');
+    var cluster = CLUSTER_SERIES.clusters[id];
+
+    function draw(grouping) {{
+        var byYear = grouping === 'année';
+        var layout = {{
+            xaxis: {{title: {{text: byYear ? 'Année' : 'Mois'}}}},
+            yaxis: {{title: {{text: 'Nombre de photos'}}}},
+            hovermode: 'x'
+        }};
+        if (!cluster) {{
+            layout.title = {{text: 'Aucune donnée pour le cluster ' + id}};
+            Plotly.react('plot', [], layout);
+            return;
+        }}
+        layout.title = {{text: 'Distribution temporelle du cluster ' + cluster.name + ' (ID: ' + id + ')'}};
+        // Par année, forcer l'affichage de toutes les années
+        if (byYear) {{
+            layout.xaxis.dtick = 1;
+            layout.xaxis.type = 'category';
+            layout.xaxis.categoryorder = 'category ascending';
+        }}
+        var series = cluster[grouping];
+        Plotly.react('plot', [{{x: series.x, y: series.y, type: 'scatter', mode: 'lines'}}], layout);
+    }}
+
+    document.getElementById('grouping').value = CLUSTER_SERIES.grouping;
+    draw(CLUSTER_SERIES.grouping);
+</script>
+</body>
+</html>
+"""
+
+
+def plotly_file():
+    """Nom du fichier plotly.js local (un par version, écrit une seule fois)"""
+    return f"plotly-{plotly.__version__}.min.js"
+
+
+def write_plot_bundle(cube, clusters, names, time_grouping, plots_dir=PLOTS_DIR):
+    """Écrit la page des distributions temporelles et le fichier de données des clusters.
+
+    cube     : TimeCube des photos affichées (les séries par mois et par année en sont tirées,
+               la page passe de l'une à l'autre sans nouveau calcul)
+    clusters : clusters pour lesquels un graphique est proposé
+    names    : nom de chaque cluster
+    Renvoie le chemin de la page pour chaque cluster (avec son identifiant en paramètre).
+    """
+    os.makedirs(plots_dir, exist_ok=True)
+
+    # Supprimer les pages par cluster de l'ancien format, si le dossier en contient encore
+    for file in os.listdir(plots_dir):
+        if file.startswith('cluster_') and file.endswith('_distribution.html'):
+            os.remove(os.path.join(plots_dir, file))
+
+    plotly_path = os.path.join(plots_dir, plotly_file())
+    if not os.path.exists(plotly_path):
+        with open(plotly_path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    clusters = [cluster_id for cluster_id in clusters if cluster_id in cube]
+    data = {'grouping': time_grouping, 'clusters': {}}
+    for cluster_id in clusters:
+        entry = {'name': names[cluster_id]}
+        for grouping in ("mois", "année"):
+            x, y = cube.series(cluster_id, grouping)
+            entry[grouping] = {'x': x, 'y': y.tolist()}
+        data['clusters'][str(cluster_id)] = entry
+    with open(os.path.join(plots_dir, DATA_FILE), 'w', encoding='utf-8') as f:
+        f.write("var CLUSTER_SERIES = " + json.dumps(data, ensure_ascii=False) + ";\n")
+    with open(os.path.join(plots_dir, PAGE_FILE), 'w', encoding='utf-8') as f:
+        f.write(PAGE_TEMPLATE.format(plotly_file=plotly_file(), data_file=DATA_FILE))
+
+    page = f"{plots_dir}/{PAGE_FILE}"
+    return {cluster_id: f"{page}?cluster={cluster_id}" for cluster_id in clusters}
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+def allocate(counts, size):
+    """Répartit size tirages entre des groupes au prorata de leurs effectifs (plus forts restes).
+
+    La somme des quotas vaut exactement min(size, total) et aucun quota ne dépasse l'effectif.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = counts.sum()
+    if size >= total:
+        return counts.copy()
+    exact = counts * size / total
+    quota = np.floor(exact).astype(np.int64)
+    # Les tirages restants vont aux groupes dont la partie fractionnaire est la plus grande
+    remaining = size - quota.sum()
+    order = np.argsort(-(exact - quota), kind='stable')
+    quota[order[:remaining]] += 1
+    return quota
+
+
+def stratified_positions(labels, size, random_state=42):
+    """Positions (triées) d'un échantillon de size lignes, stratifié par label.
+
+    Chaque label reçoit un nombre de lignes proportionnel à son effectif (arrondi par la
+    méthode des plus forts restes, le total est exact) ; les lignes sont tirées sans remise
+    en une seule passe : tri par (label, clé aléatoire) puis on garde les premières de
+    chaque label.
+    """
+    labels = np.asarray(labels)
+    if len(labels) <= size:
+        return np.arange(len(labels))
+    rng = np.random.default_rng(random_state)
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    quota = allocate(counts, size)
+
+    order = np.lexsort((rng.random(len(labels)), inverse))
+    starts = np.cumsum(counts) - counts
+    group = inverse[order]
+    rank = np.arange(len(labels)) - starts[group]
+    return np.sort(order[rank < quota[group]])
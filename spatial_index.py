@@ -0,0 +1,111 @@
+import numpy as np
+from clustering import project_to_metres
+
+# Côté des cellules de l'index, en mètres
+CELL_SIZE = 250
+# Nombre maximal de cellules (au-delà, les cellules sont agrandies)
+MAX_CELLS = 1000000
+
+
+def parse_region(text):
+    """Lit une zone saisie sous la forme "lat, long; lat, long; ...".
+
+    Deux points sont les coins opposés d'un rectangle, trois points ou plus les sommets d'un
+    polygone. Renvoie un tableau (n, 2) de (lat, long) ; lève ValueError si la saisie est invalide.
+    """
+    points = [p for p in text.replace('\n', ';').split(';') if p.strip()]
+    try:
+        vertices = np.array([[float(v) for v in p.split(',')] for p in points], dtype=np.float64)
+    except ValueError:
+        raise ValueError(f"Zone invalide : '{text}' (format attendu : lat, long; lat, long; ...)")
+    if vertices.ndim != 2 or vertices.shape[1] != 2 or len(vertices) < 2:
+        raise ValueError(f"Zone invalide : '{text}' (au moins deux points lat, long)")
+    return vertices
+
+
+def points_in_polygon(lat, lon, vertices):
+    """Masque des points (lat, long) à l'intérieur d'un polygone (règle pair-impair, un passage par arête)"""
+    inside = np.zeros(len(lat), dtype=bool)
+    y, x = vertices[:, 0], vertices[:, 1]
+    for i in range(len(vertices)):
+        y1, x1, y2, x2 = y[i - 1], x[i - 1], y[i], x[i]
+        crosses = (y1 > lat) != (y2 > lat)
+        if y1 != y2:
+            crosses &= lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses
+    return inside
+
+
+class SpatialIndex:
+    """Index spatial des photos : identifiants des lignes rangés par cellule d'une grille régulière.
+
+    Les cellules font CELL_SIZE mètres de côté ; une cellule est l'intervalle
+    order[offsets[k]:offsets[k + 1]] (cellules numérotées colonne par colonne). Une requête ne
+    lit que les cellules qui touchent la zone puis vérifie les coordonnées des candidats :
+    son coût dépend du nombre de points de la zone, pas de la taille du jeu de données.
+    """
+
+    def __init__(self, lat, lon, cell_size=CELL_SIZE):
+        """Construit l'index à partir des colonnes 'lat' et 'long' (une ligne par photo)"""
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.n_rows = len(self.lat)
+        valid = np.flatnonzero(~(np.isnan(self.lat) | np.isnan(self.lon)))
+
+        # Taille des cellules en degrés (pas du nord-sud et de l'est-ouest à la latitude moyenne)
+        if len(valid):
+            self.origin = np.array([self.lat[valid].min(), self.lon[valid].min()])
+            extent = np.array([self.lat[valid].max(), self.lon[valid].max()]) - self.origin
+        else:
+            self.origin, extent = np.zeros(2), np.zeros(2)
+        metres = project_to_metres(self.origin[None, :] + [[0, 0], [1, 1]], self.origin)[1]
+        self.step = np.array([cell_size / metres[1], cell_size / metres[0]])
+        self.shape = np.floor(extent / self.step).astype(np.int64) + 1
+        while self.shape.prod() > MAX_CELLS:
+            self.step *= 2
+            self.shape = np.floor(extent / self.step).astype(np.int64) + 1
+
+        cells = self._cells(self.lat[valid], self.lon[valid])
+        keys = cells[:, 1] * self.shape[0] + cells[:, 0]
+        order = np.argsort(keys, kind='stable')
+        self.order = valid[order].astype(np.int32)
+        self.offsets = np.zeros(self.shape.prod() + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.shape.prod()), out=self.offsets[1:])
+
+    def _cells(self, lat, lon):
+        """Cellule (ligne, colonne) de chaque point, bornée à la grille"""
+        cells = np.floor((np.column_stack([lat, lon]) - self.origin) / self.step).astype(np.int64)
+        return np.clip(cells, 0, self.shape - 1)
+
+    def _candidates(self, lat_min, lon_min, lat_max, lon_max):
+        """Lignes des cellules qui touchent un rectangle"""
+        if (lat_max < self.origin[0] or lon_max < self.origin[1] or
+                lat_min > self.origin[0] + self.shape[0] * self.step[0] or
+                lon_min > self.origin[1] + self.shape[1] * self.step[1]):
+            return self.order[:0]
+        (r0, c0), (r1, c1) = self._cells(np.array([lat_min, lat_max]), np.array([lon_min, lon_max]))
+        # Dans une colonne, les cellules r0..r1 sont contiguës : une tranche par colonne
+        first = np.arange(c0, c1 + 1) * self.shape[0]
+        return np.concatenate([self.order[self.offsets[k + r0]:self.offsets[k + r1 + 1]] for k in first])
+
+    def rectangle(self, lat_min, lon_min, lat_max, lon_max):
+        """Lignes (triées) des points dans un rectangle, bords compris"""
+        rows = self._candidates(lat_min, lon_min, lat_max, lon_max)
+        lat, lon = self.lat[rows], self.lon[rows]
+        inside = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return np.sort(rows[inside])
+
+    def polygon(self, vertices):
+        """Lignes (triées) des points dans un polygone de sommets (lat, long)"""
+        vertices = np.asarray(vertices, dtype=np.float64)
+        (lat_min, lon_min), (lat_max, lon_max) = vertices.min(axis=0), vertices.max(axis=0)
+        rows = self._candidates(lat_min, lon_min, lat_max, lon_max)
+        return np.sort(rows[points_in_polygon(self.lat[rows], self.lon[rows], vertices)])
+
+    def query(self, vertices):
+        """Lignes (triées) d'une zone de parse_region : rectangle (2 points) ou polygone"""
+        vertices = np.asarray(vertices, dtype=np.float64)
+        if len(vertices) == 2:
+            (lat_min, lon_min), (lat_max, lon_max) = vertices.min(axis=0), vertices.max(axis=0)
+            return self.rectangle(lat_min, lon_min, lat_max, lon_max)
+        return self.polygon(vertices)
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+# Mots trop génériques pour être proposés comme suggestions
+SUGGESTION_EXCLUDED = ['unknown', 'lyon', '', 'france', 'europe']
+
+
+def normalize_tag(tag):
+    """Normalise un tag de la même façon que la recherche : minuscules, sans espaces autour"""
+    return tag.lower().strip()
+
+
+def query_terms(query):
+    """Termes littéraux d'une requête (sans &, |, guillemets ni *), normalisés et sans doublon"""
+    terms = []
+    for alternative in query.split('|'):
+        for term in alternative.split('&'):
+            term = normalize_tag(term).strip('"*').strip()
+            if term and term not in terms:
+                terms.append(term)
+    return terms
+
+
+def _csr(keys, values, n_keys):
+    """Trie les couples (clé, valeur), supprime les doublons et renvoie (offsets, valeurs)"""
+    order = np.lexsort((values, keys))
+    keys = keys[order]
+    values = values[order]
+    if len(keys):
+        distinct = np.ones(len(keys), dtype=bool)
+        distinct[1:] = (keys[1:] != keys[:-1]) | (values[1:] != values[:-1])
+        keys = keys[distinct]
+        values = values[distinct]
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+    return offsets, values
+
+
+class TagIndex:
+    """Index inversé des tags : pour chaque tag normalisé, la liste triée des lignes qui le portent.
+
+    Les tags sont rangés par ordre alphabétique, les tags d'un même préfixe forment donc un
+    intervalle d'identifiants. Un index de trigrammes sur le vocabulaire sert aux recherches
+    par sous-chaîne.
+
+    Syntaxe des requêtes :
+        insa                  lignes dont un tag contient "insa"
+        insa*                 lignes dont un tag commence par "insa"
+        "insa"                lignes qui ont exactement le tag "insa"
+        insa & nuit           ET : intersection des listes
+        insa | confluence     OU : union des listes (le & est prioritaire)
+    """
+
+    def __init__(self, tags):
+        """Construit l'index à partir de la colonne 'tags' (une ligne par photo)"""
+        self.n_rows = len(tags)
+        tokens = pd.Series(tags.to_numpy(), dtype=object).fillna('').str.lower().str.split(',').explode().str.strip()
+        tokens = tokens[tokens != '']
+        codes, vocab = pd.factorize(tokens, sort=True)
+
+        self.vocab = np.asarray(vocab, dtype=object)
+        self.offsets, self.rows = _csr(codes.astype(np.int64), tokens.index.to_numpy(dtype=np.int64),
+                                       len(self.vocab))
+        self.rows = self.rows.astype(np.int32)
+        # Nombre de photos portant chaque tag
+        self.frequency = np.diff(self.offsets)
+
+        self._trigram_vocab = None
+        self._trigram_offsets = None
+        self._trigram_tokens = None
+
+    # --- Recherche dans le vocabulaire ---
+
+    def _prefix_range(self, prefix):
+        """Intervalle [début, fin) des identifiants de tags commençant par prefix"""
+        lo = np.searchsorted(self.vocab, prefix, side='left')
+        hi = np.searchsorted(self.vocab, prefix + '￿', side='left')
+        return lo, hi
+
+    def _exact_id(self, tag):
+        i = np.searchsorted(self.vocab, tag)
+        if i < len(self.vocab) and self.vocab[i] == tag:
+            return i
+        return None
+
+    def _build_trigrams(self):
+        """Construit l'index trigramme -> tags, uniquement à la première recherche par sous-chaîne"""
+        vocab = pd.Series(self.vocab)
+        lengths = vocab.str.len().to_numpy()
+        grams = []
+        token_ids = []
+        for start in range(max(lengths.max(initial=0) - 2, 0)):
+            ids = np.flatnonzero(lengths >= start + 3)
+            grams.append(vocab.iloc[ids].str.slice(start, start + 3).to_numpy())
+            token_ids.append(ids)
+        grams = np.concatenate(grams) if grams else np.empty(0, dtype=object)
+        token_ids = np.concatenate(token_ids) if token_ids else np.empty(0, dtype=np.int64)
+
+        codes, gram_vocab = pd.factorize(grams, sort=True)
+        self._trigram_vocab = np.asarray(gram_vocab, dtype=object)
+        self._trigram_offsets, self._trigram_tokens = _csr(codes.astype(np.int64), token_ids,
+                                                           len(self._trigram_vocab))
+
+    def _substring_ids(self, term):
+        """Identifiants des tags contenant term"""
+        if len(term) < 3:
+            candidates = np.arange(len(self.vocab))
+        else:
+            if self._trigram_vocab is None:
+                self._build_trigrams()
+            candidates = None
+            for start in range(len(term) - 2):
+                gram = term[start:start + 3]
+                g = np.searchsorted(self._trigram_vocab, gram)
+                if g >= len(self._trigram_vocab) or self._trigram_vocab[g] != gram:
+                    return np.empty(0, dtype=np.int64)
+                ids = self._trigram_tokens[self._trigram_offsets[g]:self._trigram_offsets[g + 1]]
+                candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        # Vérifier les candidats (les trigrammes ne garantissent pas l'ordre)
+        found = pd.Series(self.vocab[candidates]).str.contains(term, regex=False).to_numpy()
+        return candidates[found]
+
+    def _postings(self, token_ids):
+        """Union des listes de lignes d'un ensemble de tags"""
+        if len(token_ids) == 0:
+            return np.empty(0, dtype=np.int32)
+        if len(token_ids) == 1:
+            t = token_ids[0]
+            return self.rows[self.offsets[t]:self.offsets[t + 1]]
+        return np.unique(np.concatenate([self.rows[self.offsets[t]:self.offsets[t + 1]] for t in token_ids]))
+
+    def _range_postings(self, lo, hi):
+        """Union des listes de lignes des tags d'identifiants contigus [lo, hi)"""
+        return np.unique(self.rows[self.offsets[lo]:self.offsets[hi]])
+
+    # --- Requêtes ---
+
+    def lookup(self, term):
+        """Lignes correspondant à un terme (exact, préfixe ou sous-chaîne selon sa syntaxe)"""
+        term = term.strip()
+        if len(term) >= 2 and term.startswith('"') and term.endswith('"'):
+            t = self._exact_id(normalize_tag(term[1:-1]))
+            return self._postings([] if t is None else [t])
+        if term.endswith('*'):
+            lo, hi = self._prefix_range(normalize_tag(term[:-1]))
+            return self._range_postings(lo, hi)
+        return self._postings(self._substring_ids(normalize_tag(term)))
+
+    def search(self, query):
+        """Lignes (triées) correspondant à une requête avec & (ET) et | (OU)"""
+        result = None
+        for alternative in query.split('|'):
+            rows = None
+            for term in alternative.split('&'):
+                if not term.strip():
+                    continue
+                term_rows = self.lookup(term)
+                rows = term_rows if rows is None else np.intersect1d(rows, term_rows, assume_unique=True)
+            if rows is None:
+                continue
+            result = rows if result is None else np.union1d(result, rows)
+        if result is None:
+            return np.empty(0, dtype=np.int32)
+        return result
+
+    def row_mask(self, query):
+        """Masque booléen sur toutes les lignes du jeu de données pour une requête"""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.search(query)] = True
+        return mask
+
+    def complete(self, prefix, limit=5, excluded=SUGGESTION_EXCLUDED):
+        """Tags commençant par prefix, du plus fréquent au moins fréquent"""
+        lo, hi = self._prefix_range(normalize_tag(prefix))
+        ids = np.arange(lo, hi)
+        if excluded:
+            ids = ids[~np.isin(self.vocab[ids], excluded)]
+        if len(ids) > limit:
+            ids = ids[np.argpartition(-self.frequency[ids], limit)[:limit]]
+        ids = ids[np.argsort(-self.frequency[ids], kind='stable')]
+        return [(self.vocab[i], int(self.frequency[i])) for i in ids]
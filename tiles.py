@@ -0,0 +1,92 @@
+import os
+import shutil
+import numpy as np
+from PIL import Image
+
+TILES_DIR = 'map_tiles'
+TILE_SIZE = 256
+CELL_SIZE = 4  # côté d'une cellule d'agrégation, en pixels
+MIN_ZOOM = 11
+MAX_ZOOM = 18
+
+
+def mercator(lat, lon):
+    """Coordonnées Web Mercator normalisées (0..1) utilisées par les tuiles de Leaflet"""
+    s = np.sin(np.radians(lat))
+    x = (np.asarray(lon, dtype=np.float64) + 180) / 360
+    y = 0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)
+    return x, y
+
+
+def _rgb(color):
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+def aggregate_cells(x, y, cluster, zoom):
+    """Agrège les points dans les cellules d'un niveau de zoom.
+
+    Renvoie, pour chaque cellule occupée : colonne et ligne de la cellule, nombre de points
+    et cluster dominant (le plus fréquent hors bruit, le bruit si la cellule n'a que du bruit).
+    """
+    n_cells = (TILE_SIZE // CELL_SIZE) << zoom
+    cx = np.minimum((x * n_cells).astype(np.int64), n_cells - 1)
+    cy = np.minimum((y * n_cells).astype(np.int64), n_cells - 1)
+    cell_keys, cell_idx, counts = np.unique(cx * n_cells + cy, return_inverse=True, return_counts=True)
+
+    dominant = dominant_cluster(cell_idx, cluster, len(cell_keys))
+    return cell_keys // n_cells, cell_keys % n_cells, counts, dominant
+
+
+def dominant_cluster(cell_idx, cluster, n_cells):
+    """Cluster le plus fréquent de chaque cellule (-1 seulement si la cellule n'a que du bruit)"""
+    # Comptes (cellule, cluster), le bruit compté à part pour ne l'emporter que seul
+    n_labels = int(cluster.max()) + 2
+    pair_keys, pair_counts = np.unique(cell_idx * n_labels + (cluster + 1), return_counts=True)
+    pair_cell = pair_keys // n_labels
+    pair_label = pair_keys % n_labels - 1
+    score = np.where(pair_label >= 0, pair_counts, 0)
+    order = np.lexsort((-score, pair_cell))
+    first = np.searchsorted(pair_cell[order], np.arange(n_cells))
+    return pair_label[order][first]
+
+
+def build_tile_pyramid(lat, lon, cluster, colors, out_dir=TILES_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM,
+                       progress=None):
+    """Écrit les tuiles PNG {zoom}/{x}/{y}.png de la densité des points, du zoom min_zoom à max_zoom.
+
+    Chaque cellule de CELL_SIZE pixels prend la couleur de son cluster dominant (gris pour le
+    bruit) et une opacité croissante avec son nombre de points (échelle logarithmique).
+    Seules les tuiles contenant des points sont écrites. Renvoie le nombre de tuiles.
+    """
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    x, y = mercator(lat, lon)
+    cluster = np.asarray(cluster, dtype=np.int64)
+    palette = np.array([_rgb(c) for c in colors], dtype=np.uint8)
+    cells_per_tile = TILE_SIZE // CELL_SIZE
+
+    n_tiles = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        if progress is not None:
+            progress(zoom)
+        cx, cy, counts, dominant = aggregate_cells(x, y, cluster, zoom)
+        alpha = (60 + 195 * np.log1p(counts) / np.log1p(counts.max())).astype(np.uint8)
+        rgba = np.column_stack([palette[dominant + 1], alpha])
+
+        # Regrouper les cellules par tuile
+        tile_keys = (cx // cells_per_tile) * (1 << zoom) + cy // cells_per_tile
+        order = np.argsort(tile_keys, kind='stable')
+        tile_keys = tile_keys[order]
+        starts = np.flatnonzero(np.r_[True, tile_keys[1:] != tile_keys[:-1]])
+        ends = np.r_[starts[1:], len(tile_keys)]
+        for start, end in zip(starts, ends):
+            cells = order[start:end]
+            tx, ty = divmod(int(tile_keys[start]), 1 << zoom)
+            image = np.zeros((cells_per_tile, CELL_SIZE, cells_per_tile, CELL_SIZE, 4), dtype=np.uint8)
+            image[cy[cells] % cells_per_tile, :, cx[cells] % cells_per_tile, :] = rgba[cells][:, None, None, :]
+            tile_dir = os.path.join(out_dir, str(zoom), str(tx))
+            os.makedirs(tile_dir, exist_ok=True)
+            Image.fromarray(image.reshape(TILE_SIZE, TILE_SIZE, 4), 'RGBA').save(
+                os.path.join(tile_dir, f"{ty}.png"), optimize=False)
+            n_tiles += 1
+    return n_tiles
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Regroupements temporels disponibles
+GROUPINGS = ("jour", "mois", "année")
+
+
+class TimeCube:
+    """Nombre de photos par (cluster, jour), calculé en une seule passe après le clustering.
+
+    Les comptes sont rangés au format CSR : pour chaque cluster (dans l'ordre croissant des
+    labels), la liste triée de ses jours avec au moins une photo et leur nombre de photos.
+    Les regroupements par mois et par année sont obtenus à partir de ces comptes journaliers
+    (jamais à partir des lignes) et gardés en cache.
+    """
+
+    def __init__(self, partition, dates):
+        """partition : ClusterPartition des lignes, dates : date_taken de ces lignes (même ordre)"""
+        dates = pd.Series(dates)
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, format='%Y-%m-%d %H:%M:%S', errors='coerce')
+        days = dates.to_numpy(dtype='datetime64[D]')
+        valid = ~np.isnat(days)
+
+        self.clusters = partition.clusters
+        self._partition = partition
+        self._daily = self._rollup(partition.group[valid], days[valid].astype(np.int64))
+        self._cache = {"jour": self._daily}
+
+    def _rollup(self, cluster_idx, buckets, weights=None):
+        """Comptes (cluster, période) au format CSR à partir de couples éventuellement pondérés"""
+        offset = buckets.min(initial=0)
+        span = buckets.max(initial=0) - offset + 1
+        keys, inverse = np.unique(cluster_idx * span + (buckets - offset), return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(keys)).astype(np.int64)
+        owner = keys // span
+        indptr = np.zeros(len(self.clusters) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owner, minlength=len(self.clusters)), out=indptr[1:])
+        return indptr, keys % span + offset, counts
+
+    def _grouped(self, grouping):
+        if grouping not in self._cache:
+            indptr, days, counts = self._daily
+            owner = np.repeat(np.arange(len(self.clusters)), np.diff(indptr))
+            unit = 'M' if grouping == "mois" else 'Y'
+            buckets = days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype(np.int64)
+            self._cache[grouping] = self._rollup(owner, buckets, weights=counts)
+        return self._cache[grouping]
+
+    def __contains__(self, cluster_id):
+        return cluster_id in self._partition
+
+    def counts(self, cluster_id, grouping="mois"):
+        """Périodes (datetime64 : jour, mois ou année) et nombres de photos d'un cluster.
+
+        Par mois, les mois sans photo entre le premier et le dernier sont comptés à 0 ;
+        par jour et par année, seules les périodes avec des photos sont renvoyées.
+        """
+        indptr, buckets, counts = self._grouped(grouping)
+        i = self._partition.index(cluster_id)
+        buckets, counts = buckets[indptr[i]:indptr[i + 1]], counts[indptr[i]:indptr[i + 1]]
+        unit = {"jour": 'D', "mois": 'M', "année": 'Y'}[grouping]
+        if grouping == "mois" and len(buckets):
+            full = np.arange(buckets[0], buckets[-1] + 1)
+            filled = np.zeros(len(full), dtype=np.int64)
+            filled[buckets - buckets[0]] = counts
+            buckets, counts = full, filled
+        return buckets.astype(f'datetime64[{unit}]'), counts
+
+    def series(self, cluster_id, grouping="mois"):
+        """Comme counts, avec les périodes en texte ('2015-03', '2015' ou '2015-03-14')"""
+        periods, counts = self.counts(cluster_id, grouping)
+        return [str(p) for p in periods], counts
+
+    def all_series(self, grouping="mois", clusters=None):
+        """Séries de plusieurs clusters (tous par défaut) : dictionnaire cluster -> (périodes, comptes)"""
+        clusters = self.clusters if clusters is None else clusters
+        return {cluster_id: self.series(cluster_id, grouping) for cluster_id in clusters if cluster_id in self}
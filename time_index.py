@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+
+def intersect_rows(*row_sets):
+    """Intersection de listes triées d'identifiants de lignes (None = pas de filtre).
+
+    Renvoie None si aucune liste n'est donnée, sinon la liste triée des lignes communes.
+    """
+    result = None
+    for rows in row_sets:
+        if rows is None:
+            continue
+        result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+    return result
+
+
+class TimeIndex:
+    """Index temporel des photos : identifiants des lignes triés par date de prise de vue.
+
+    keys contient les dates (datetime64) dans l'ordre croissant et order les lignes
+    correspondantes ; les photos sans date valide ne sont pas indexées. Une période est
+    l'intervalle de keys trouvé par deux recherches dichotomiques, sans parcourir les lignes.
+    """
+
+    def __init__(self, dates):
+        """Construit l'index à partir de la colonne 'date_taken' (une ligne par photo)"""
+        dates = pd.Series(dates)
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors='coerce')
+        keys = dates.to_numpy(dtype='datetime64[ns]')
+        self.n_rows = len(keys)
+
+        valid = np.flatnonzero(~np.isnat(keys))
+        order = np.argsort(keys[valid], kind='stable')
+        self.order = valid[order].astype(np.int32)
+        self.keys = keys[self.order]
+
+    def first(self):
+        """Date la plus ancienne (NaT si aucune date)"""
+        return self.keys[0] if len(self.keys) else np.datetime64('NaT')
+
+    def last(self):
+        """Date la plus récente (NaT si aucune date)"""
+        return self.keys[-1] if len(self.keys) else np.datetime64('NaT')
+
+    def range(self, start, end):
+        """Lignes prises entre start (inclus) et end (exclu), dans l'ordre des dates (vue, sans copie)"""
+        lo = np.searchsorted(self.keys, np.datetime64(start, 'ns'), side='left')
+        hi = np.searchsorted(self.keys, np.datetime64(end, 'ns'), side='left')
+        return self.order[lo:max(lo, hi)]
+
+    def search(self, first_day, last_day):
+        """Lignes (triées) prises entre deux jours, bornes comprises"""
+        start = np.datetime64(first_day, 'D')
+        end = np.datetime64(last_day, 'D') + np.timedelta64(1, 'D')
+        return np.sort(self.range(start, end))
+
+    def row_mask(self, first_day, last_day):
+        """Masque booléen sur toutes les lignes du jeu de données pour une période"""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.range(np.datetime64(first_day, 'D'),
+                        np.datetime64(last_day, 'D') + np.timedelta64(1, 'D'))] = True
+        return mask
@@ -0,0 +1,142 @@
+import unicodedata
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Mots exclus lors du comptage des tags les plus communs
+BASE_EXCLUDED = ['unknown', 'lyon', '', 'france', 'europe']
+
+
+@lru_cache(maxsize=None)
+def remove_accents(text):
+    text = unicodedata.normalize('NFD', text)
+    text = text.encode('ascii', 'ignore').decode('utf-8')
+    return text
+
+
+def has_digit(text):
+    return any(c.isdigit() for c in text)
+
+
+def _apply_unique(values, func):
+    """Applique func une seule fois par valeur distincte (le vocabulaire est bien plus petit que les données)"""
+    codes, uniques = pd.factorize(values)
+    mapped = np.array([func(u) for u in uniques], dtype=object)
+    return mapped[codes]
+
+
+def _indptr(rows, n_rows):
+    """Pointeurs CSR à partir des numéros de ligne (triés) de chaque valeur"""
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr
+
+
+def take(indptr, values, rows):
+    """Concatène les valeurs CSR des lignes demandées, dans l'ordre des lignes.
+
+    Renvoie les valeurs et, pour chacune, la position dans `rows` de la ligne d'origine.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    positions = starts[owner] + np.arange(lengths.sum()) - offsets[owner]
+    return values[positions], owner
+
+
+class TokenizedDataset:
+    """Tags et titres d'un jeu de données découpés une seule fois en identifiants de tokens.
+
+    Deux vocabulaires :
+      - les tags entiers normalisés (minuscules, sans accents), utilisés pour les exclusions ;
+      - les termes : sous-tags (tag découpé sur '_' et '-') et mots des titres.
+
+    Stockage au format CSR (ligne -> tokens) :
+      - tag_indptr / tag_ids        : tags entiers de chaque ligne (avec répétitions)
+      - tag_terms_indptr / tag_terms : sous-tags de chaque tag entier
+      - tag_doc_term                 : terme correspondant au tag entier (-1 s'il contient un séparateur)
+      - title_indptr / title_terms   : mots du titre de chaque ligne
+
+    Les lignes sont repérées par leur position dans le DataFrame d'origine (qui doit avoir un
+    index 0..n-1, comme celui du DatasetManager).
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+
+        # Tags entiers : minuscules, sans espaces autour, sans accents
+        tags = pd.Series(df['tags'].to_numpy(), dtype=object).fillna('').str.lower().str.split(',').explode()
+        whole = _apply_unique(tags.str.strip().to_numpy(dtype=object), remove_accents)
+        keep = whole != ''
+        tag_rows = tags.index.to_numpy()[keep]
+        tag_codes, tag_vocab = pd.factorize(whole[keep])
+        self.tag_vocab = np.asarray(tag_vocab, dtype=object)
+        self.tag_ids = tag_codes.astype(np.int64)
+        self.tag_indptr = _indptr(tag_rows, self.n_rows)
+        self.tag_has_digit = np.array([has_digit(t) for t in self.tag_vocab], dtype=bool)
+
+        # Mots des titres (accents retirés avant le passage en minuscules)
+        titles = pd.Series(df['title'].to_numpy(), dtype=object).fillna('')
+        words = pd.Series(_apply_unique(titles.to_numpy(dtype=object), lambda t: remove_accents(t).lower()))
+        words = words.str.split().explode().dropna()
+        title_codes, title_words = pd.factorize(words)
+
+        # Vocabulaire des termes : sous-tags, tags entiers sans séparateur et mots des titres
+        subtags = [t.replace('_', ' ').replace('-', ' ').split() for t in self.tag_vocab]
+        doc_terms = [t.replace('_', ' ').replace('-', ' ').strip() for t in self.tag_vocab]
+        doc_terms = [t if t and ' ' not in t else None for t in doc_terms]
+        candidates = [s for sub in subtags for s in sub] + [t for t in doc_terms if t] + list(title_words)
+        self.term_vocab = np.asarray(pd.unique(np.array(candidates, dtype=object)), dtype=object)
+        term_lookup = pd.Index(self.term_vocab)
+        self.term_has_digit = np.array([has_digit(t) for t in self.term_vocab], dtype=bool)
+        self.term_length = np.array([len(t) for t in self.term_vocab], dtype=np.int64)
+
+        flat_subtags = [s for sub in subtags for s in sub]
+        self.tag_terms = term_lookup.get_indexer(flat_subtags).astype(np.int64)
+        self.tag_terms_indptr = np.zeros(len(self.tag_vocab) + 1, dtype=np.int64)
+        np.cumsum([len(sub) for sub in subtags], out=self.tag_terms_indptr[1:])
+        self.tag_doc_term = np.array([term_lookup.get_loc(t) if t else -1 for t in doc_terms], dtype=np.int64)
+
+        title_term_ids = term_lookup.get_indexer(title_words).astype(np.int64)
+        self.title_terms = title_term_ids[title_codes]
+        self.title_indptr = _indptr(words.index.to_numpy(), self.n_rows)
+
+    # --- Masques d'exclusion ---
+
+    def excluded_tags(self, mots_exclus):
+        """Masque des tags entiers ignorés : mots exclus ou tags contenant un chiffre"""
+        return pd.Index(self.tag_vocab).isin(mots_exclus) | self.tag_has_digit
+
+    def excluded_terms(self, mots_exclus):
+        """Masque des termes faisant partie des mots exclus"""
+        return pd.Index(self.term_vocab).isin(mots_exclus)
+
+    # --- Accès par lignes ---
+
+    def subtag_terms(self, rows, tag_excluded):
+        """Sous-tags des lignes demandées, dans l'ordre, en ignorant les tags exclus"""
+        tag_ids, _ = take(self.tag_indptr, self.tag_ids, rows)
+        tag_ids = tag_ids[~tag_excluded[tag_ids]]
+        terms, _ = take(self.tag_terms_indptr, self.tag_terms, tag_ids)
+        return terms
+
+    def document_terms(self, rows, tag_excluded, term_excluded):
+        """Termes distincts présents dans un ensemble de lignes (tags entiers et mots des titres)"""
+        tag_ids, _ = take(self.tag_indptr, self.tag_ids, rows)
+        tag_terms = self.tag_doc_term[tag_ids[~tag_excluded[tag_ids]]]
+        title_terms, _ = take(self.title_indptr, self.title_terms, rows)
+        title_terms = title_terms[~(term_excluded[title_terms] | self.term_has_digit[title_terms])]
+        return np.unique(np.concatenate([tag_terms[tag_terms >= 0], title_terms]))
+
+    def common_tags(self, rows, n, mots_exclus=BASE_EXCLUDED):
+        """Les n sous-tags les plus fréquents (à égalité, dans l'ordre de première apparition)"""
+        if n <= 0:
+            return []
+        terms = self.subtag_terms(rows, self.excluded_tags(mots_exclus))
+        if len(terms) == 0:
+            return []
+        unique_terms, first, counts = np.unique(terms, return_index=True, return_counts=True)
+        order = np.lexsort((first, -counts))[:n]
+        return list(self.term_vocab[unique_terms[order]])